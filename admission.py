@@ -0,0 +1,242 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from cancellation import CancellationToken, GenerationCancelled
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lower values are admitted first
+INTERACTIVE = 0
+CLASSIFICATION = 1
+BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    INTERACTIVE: "interactive",
+    CLASSIFICATION: "classification",
+    BACKGROUND: "background",
+}
+
+BUSY_MESSAGE = "The assistant is busy right now. Please try again in a moment."
+
+
+class AdmissionRejected(Exception):
+    """Raised when an upstream call is refused instead of queued or kept waiting."""
+
+    def __init__(self, reason: str, retry_after: float = 1.0):
+        super().__init__(f"{BUSY_MESSAGE} ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Permit:
+    """One admitted upstream call. ``release`` frees its slot and is idempotent."""
+
+    def __init__(self, controller: Optional["AdmissionController"] = None):
+        self._controller = controller
+        self._released = controller is None
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._controller._release()
+
+    def __enter__(self) -> "Permit":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Waiter:
+    __slots__ = ("priority", "event", "granted", "rejected", "abandoned")
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self.event = threading.Event()
+        self.granted = False
+        self.rejected: Optional[str] = None
+        self.abandoned = False
+
+
+class AdmissionController:
+    """
+    Process-wide cap on concurrent upstream LLM calls.
+
+    Calls beyond ``max_concurrency`` wait in a priority queue (interactive
+    before classification before background work, FIFO within a priority).
+    A call that waits longer than its priority's deadline is refused, and
+    when the queue is full a new call either displaces the lowest-priority
+    waiter or, if nothing queued ranks below it, is refused at once so the
+    caller can return a busy response instead of piling onto the backlog.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 64, deadlines: Optional[Dict[int, float]] = None, enabled: bool = True):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadlines = {INTERACTIVE: 10.0, CLASSIFICATION: 5.0, BACKGROUND: 30.0}
+        self.deadlines.update(deadlines or {})
+        self.enabled = enabled
+        self.in_flight = 0
+        self._queue: List = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "16")),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+            deadlines={
+                INTERACTIVE: float(os.getenv("ADMISSION_INTERACTIVE_DEADLINE", "10")),
+                CLASSIFICATION: float(os.getenv("ADMISSION_CLASSIFICATION_DEADLINE", "5")),
+                BACKGROUND: float(os.getenv("ADMISSION_BACKGROUND_DEADLINE", "30")),
+            },
+            enabled=os.getenv("ADMISSION_ENABLED", "1").lower() not in ("0", "false", "no")
+        )
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return sum(1 for _, _, waiter in self._queue if not waiter.abandoned)
+
+    def would_reject(self, priority: int = INTERACTIVE) -> bool:
+        """True if a call at ``priority`` would be refused right now for a full queue."""
+        with self._lock:
+            return (
+                self.enabled
+                and self.in_flight >= self.max_concurrency
+                and len(self._queue) >= self.max_queue
+                and all(entry[0] <= priority for entry in self._queue)
+            )
+
+    def try_acquire(self, priority: int = INTERACTIVE) -> Optional[Permit]:
+        """A Permit if a slot is free right now with nobody queued, else None; never waits."""
+        if not self.enabled:
+            return Permit()
+        with self._lock:
+            if self.in_flight >= self.max_concurrency or self._queue:
+                return None
+            self.in_flight += 1
+            self._update_gauges()
+        metrics.increment(f"admission.{PRIORITY_NAMES.get(priority, str(priority))}.admitted")
+        return Permit(self)
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None) -> Permit:
+        """
+        Wait for a slot and return its Permit.
+
+        Raises AdmissionRejected when the queue is full or the queue-time
+        deadline passes, and GenerationCancelled if ``cancel_token`` fires
+        while waiting.
+        """
+        if not self.enabled:
+            return Permit()
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        started = time.monotonic()
+
+        with self._lock:
+            if self.in_flight < self.max_concurrency and not self._queue:
+                self.in_flight += 1
+                self._update_gauges()
+                metrics.increment(f"admission.{name}.admitted")
+                metrics.observe(f"admission.{name}.wait_seconds", 0.0)
+                return Permit(self)
+
+            if len(self._queue) >= self.max_queue and not self._shed_for(priority):
+                metrics.increment(f"admission.{name}.rejected.queue_full")
+                raise AdmissionRejected("queue_full", retry_after=self._retry_after())
+
+            waiter = _Waiter(priority)
+            heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+            self._update_gauges()
+
+        timeout = self.deadlines.get(priority, 10.0) if timeout is None else timeout
+        deadline = started + timeout
+        while not waiter.event.wait(min(0.1, max(0.0, deadline - time.monotonic()))):
+            if (cancel_token is not None and cancel_token.cancelled) or time.monotonic() >= deadline:
+                with self._lock:
+                    if not waiter.event.is_set():
+                        waiter.abandoned = True
+                        self._prune()
+                        self._update_gauges()
+                        break
+
+        waited = time.monotonic() - started
+        metrics.observe(f"admission.{name}.wait_seconds", waited)
+        if waiter.granted:
+            if cancel_token is not None and cancel_token.cancelled:
+                self._release()
+                raise GenerationCancelled(cancel_token.reason)
+            metrics.increment(f"admission.{name}.admitted")
+            return Permit(self)
+        if waiter.rejected:
+            metrics.increment(f"admission.{name}.rejected.{waiter.rejected}")
+            raise AdmissionRejected(waiter.rejected, retry_after=self._retry_after())
+        if cancel_token is not None and cancel_token.cancelled:
+            raise GenerationCancelled(cancel_token.reason)
+        metrics.increment(f"admission.{name}.rejected.deadline")
+        raise AdmissionRejected("deadline", retry_after=self._retry_after())
+
+    @contextmanager
+    def admit(self, priority: int = INTERACTIVE, timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None):
+        """Hold a slot for the duration of a ``with`` block."""
+        permit = self.acquire(priority, timeout, cancel_token)
+        try:
+            yield permit
+        finally:
+            permit.release()
+
+    def _shed_for(self, priority: int) -> bool:
+        """Drop the lowest-priority, newest waiter if it ranks below ``priority``."""
+        live = [entry for entry in self._queue if not entry[2].abandoned]
+        if not live:
+            return False
+        victim = max(live, key=lambda entry: (entry[0], entry[1]))
+        if victim[0] <= priority:
+            return False
+        waiter = victim[2]
+        waiter.abandoned = True
+        waiter.rejected = "shed"
+        waiter.event.set()
+        self._prune()
+        return True
+
+    def _prune(self):
+        self._queue = [entry for entry in self._queue if not entry[2].abandoned]
+        heapq.heapify(self._queue)
+
+    def _release(self):
+        with self._lock:
+            # Hand the slot straight to the next waiter so it can't be
+            # taken by a newcomer that skipped the queue
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.abandoned:
+                    continue
+                waiter.granted = True
+                waiter.event.set()
+                break
+            else:
+                self.in_flight -= 1
+            self._update_gauges()
+
+    def _retry_after(self) -> float:
+        return max(1.0, metrics.percentile("admission.interactive.wait_seconds", 50) or 1.0)
+
+    def _update_gauges(self):
+        metrics.set_gauge("admission.in_flight", self.in_flight)
+        metrics.set_gauge("admission.queue_depth", len(self._queue))
+        for priority, name in PRIORITY_NAMES.items():
+            metrics.set_gauge(f"admission.{name}.queue_depth", sum(1 for entry in self._queue if entry[0] == priority))
+
+
+# Shared by every GroqClient in the process
+admission = AdmissionController.from_env()
@@ -0,0 +1,280 @@
+import os
+import json
+import queue
+import threading
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+from groq_client import GroqClient
+from cancellation import CancellationToken, GenerationCancelled
+from admission import admission, AdmissionRejected, BUSY_MESSAGE
+from metrics import metrics
+from log_config import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Sentinel placed on a stream queue once the producer has finished
+_END = object()
+
+
+def validate_messages(messages: list) -> Optional[str]:
+    """Return why ``messages`` can't be sent upstream, or None if they can."""
+    for index, message in enumerate(messages):
+        if not isinstance(message, dict):
+            return f"messages[{index}] must be an object"
+        if not isinstance(message.get("role"), str) or not isinstance(message.get("content"), str):
+            return f"messages[{index}] must have string 'role' and 'content' fields"
+    if not messages[-1]["content"].strip():
+        return "The last message must not be empty"
+    return None
+
+
+class StreamBridge:
+    """
+    Run an event generator in a worker thread and hand its events to the
+    request thread through a bounded queue.
+
+    The bounded queue provides backpressure: when a client reads slowly the
+    socket write blocks, the queue fills and the worker stops pulling from
+    the upstream stream until there is room again. While the queue is empty
+    the request thread wakes up every ``keepalive`` seconds so it can send a
+    heartbeat.
+    """
+
+    def __init__(self, events: Iterator[Tuple[str, object]], buffer_size: int = 32, put_timeout: float = 0.5):
+        self.events = events
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.put_timeout = put_timeout
+        self.stopped = threading.Event()
+        self.worker = threading.Thread(target=self._produce, daemon=True)
+
+    def start(self) -> "StreamBridge":
+        self.worker.start()
+        return self
+
+    def _put(self, item) -> bool:
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=self.put_timeout)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for event in self.events:
+                if not self._put(event):
+                    break
+        except GenerationCancelled as e:
+            logger.info(str(e))
+        except AdmissionRejected as e:
+            logger.warning(str(e))
+            self._put(("busy", {"error": BUSY_MESSAGE, "retry_after": e.retry_after}))
+        except Exception as e:
+            logger.error(f"Stream producer failed: {str(e)}")
+            self._put(("error", str(e)))
+        finally:
+            # Closing the generator closes the upstream HTTP stream
+            close = getattr(self.events, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception as e:
+                    logger.error(f"Error closing upstream stream: {str(e)}")
+            self._put(_END)
+
+    def get(self, timeout: float) -> Optional[object]:
+        """Return the next event, ``_END`` when finished, or None on timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self.stopped.set()
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler exposing chat endpoints with Server-Sent Events streaming."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "InsightAI"
+
+    routes = {
+        "/v1/chat": False,
+        "/v1/chat/search": True,
+    }
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            self.send_json(200, {
+                "status": "ok" if self.server.groq_client else "unavailable",
+                "active_streams": self.server.max_concurrency - self.server.available_slots(),
+                "upstream_in_flight": admission.in_flight,
+                "upstream_queue_depth": admission.queue_depth()
+            })
+        elif self.path == "/metrics":
+            self.send_json(200, metrics.snapshot())
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def read_json_body(self) -> Optional[Dict]:
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            return None
+
+    def do_POST(self):
+        if self.path not in self.routes:
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        payload = self.read_json_body()
+        messages = payload.get("messages") if isinstance(payload, dict) else None
+        if not messages or not isinstance(messages, list):
+            self.send_json(400, {"error": "Request body must contain a non-empty 'messages' list"})
+            return
+        error = validate_messages(messages)
+        if error:
+            self.send_json(400, {"error": error})
+            return
+
+        if self.server.groq_client is None:
+            self.send_json(503, {"error": f"Chat system is not properly initialized. Error: {self.server.initialization_error}"})
+            return
+
+        tier = payload.get("tier")
+        if tier is not None and not isinstance(tier, str):
+            self.send_json(400, {"error": "'tier' must be a string"})
+            return
+        if tier is not None and tier not in self.server.groq_client.router.tiers:
+            self.send_json(400, {"error": f"Unknown model tier: {tier}"})
+            return
+
+        # Refuse before streaming starts when upstream calls can't be queued
+        if admission.would_reject():
+            metrics.increment("api.rejected.admission")
+            self.send_json(503, {"error": BUSY_MESSAGE}, {"Retry-After": "1"})
+            return
+
+        if not self.server.slots.acquire(blocking=False):
+            self.send_json(503, {"error": "Server busy, please retry"}, {"Retry-After": "1"})
+            return
+
+        try:
+            cancel_token = CancellationToken()
+            events = self.server.groq_client.stream_response(
+                messages,
+                search=self.routes[self.path],
+                tier=tier,
+                cancel_token=cancel_token
+            )
+            self.stream_events(events, cancel_token)
+        finally:
+            self.server.slots.release()
+
+    def write_chunk(self, data: str):
+        encoded = data.encode("utf-8")
+        self.wfile.write(f"{len(encoded):x}\r\n".encode("ascii") + encoded + b"\r\n")
+        self.wfile.flush()
+
+    def stream_events(self, events: Iterator[Tuple[str, object]], cancel_token: Optional[CancellationToken] = None):
+        """
+        Relay generator events to the client as chunked Server-Sent Events.
+
+        A client disconnect fires ``cancel_token`` so the upstream request is
+        closed immediately rather than at the next event.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("X-Accel-Buffering", "no")
+        self.end_headers()
+
+        bridge = StreamBridge(events, buffer_size=self.server.stream_buffer).start()
+        try:
+            while True:
+                item = bridge.get(timeout=self.server.keepalive_interval)
+                if item is None:
+                    self.write_chunk(": keep-alive\n\n")
+                    continue
+                if item is _END:
+                    break
+                event, data = item
+                self.write_chunk(f"event: {event}\ndata: {json.dumps(data)}\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Client disconnected mid-stream")
+            self.close_connection = True
+            if cancel_token is not None:
+                cancel_token.cancel("disconnect")
+        finally:
+            bridge.stop()
+
+
+class ChatServer(ThreadingHTTPServer):
+    """Threaded HTTP server sharing one GroqClient across request threads."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], max_concurrency: int = 32, keepalive_interval: float = 15.0, stream_buffer: int = 32, groq_client: Optional[GroqClient] = None):
+        super().__init__(address, ChatRequestHandler)
+        self.max_concurrency = max_concurrency
+        self.keepalive_interval = keepalive_interval
+        self.stream_buffer = stream_buffer
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.initialization_error = None
+
+        if groq_client is not None:
+            self.groq_client = groq_client
+        else:
+            try:
+                self.groq_client = GroqClient()
+                logger.info("Initialized Groq client successfully")
+            except Exception as e:
+                logger.error(f"Failed to initialize Groq client: {str(e)}")
+                self.initialization_error = str(e)
+                self.groq_client = None
+
+    def available_slots(self) -> int:
+        # BoundedSemaphore keeps its counter in _value; fine for reporting
+        return self.slots._value
+
+
+def create_server() -> ChatServer:
+    """Build a ChatServer configured from environment variables."""
+    return ChatServer(
+        (os.getenv("API_HOST", "0.0.0.0"), int(os.getenv("API_PORT", "8080"))),
+        max_concurrency=int(os.getenv("API_MAX_CONCURRENCY", "32")),
+        keepalive_interval=float(os.getenv("API_KEEPALIVE_SECONDS", "15")),
+        stream_buffer=int(os.getenv("API_STREAM_BUFFER", "32"))
+    )
+
+
+if __name__ == "__main__":
+    try:
+        server = create_server()
+        logger.info(f"Starting API server on {server.server_address[0]}:{server.server_address[1]}")
+        server.serve_forever()
+    except Exception as e:
+        logger.error(f"Failed to start API server: {str(e)}")
+        raise
@@ -1,11 +1,15 @@
 import os
 import gradio as gr
 from groq_client import GroqClient
+from cancellation import CancellationToken
+from admission import AdmissionRejected, BUSY_MESSAGE
+from log_config import configure_logging
+from profiling import profiled
 import logging
-from typing import Tuple, List
+from typing import Tuple, List, Dict, Generator
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 class GradioChat:
@@ -18,42 +22,86 @@ class GradioChat:
             self.initialization_error = str(e)
             self.groq_client = None
 
-    def chat(self, message: str, history: List[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], str]:
-        """Main chat function that handles message processing with proper error handling."""
-        try:
-            if not message.strip():
-                return history, ""
+    @profiled("gradio_chat")
+    def chat(self, message: str, history: List[Dict], session_messages: List[Dict]) -> Generator[Tuple[List[Dict], str, List[Dict]], None, None]:
+        """
+        Stream a reply for the chat UI, yielding updated display history,
+        the cleared input box and the session's message list.
 
-            if self.groq_client is None:
-                error_msg = f"Chat system is not properly initialized. Error: {self.initialization_error}"
-                logger.error(error_msg)
-                return history + [(message, f"❌ {error_msg}")], ""
-
-            logger.info(f"Processing message: {message}")
-
-            # Convert history to messages format
-            messages = []
-            for h in history:
-                messages.extend([
-                    {"role": "user", "content": h[0]},
-                    {"role": "assistant", "content": h[1]}
-                ])
-            messages.append({"role": "user", "content": message})
-
-            # Get response with error handling
-            response = self.groq_client.generate_response(messages)
-            if response:
+        ``session_messages`` is the per-session OpenAI-format conversation. It
+        is extended in place with each completed turn rather than rebuilt
+        from the displayed history.
+        """
+        if not message.strip():
+            yield history, "", session_messages
+            return
+
+        history = history + [{"role": "user", "content": message}]
+
+        if self.groq_client is None:
+            error_msg = f"Chat system is not properly initialized. Error: {self.initialization_error}"
+            logger.error(error_msg)
+            yield history + [{"role": "assistant", "content": f"❌ {error_msg}"}], "", session_messages
+            return
+
+        logger.info("Processing message", extra={"event": "gradio.message", "chars": len(message)})
+        session_messages.append({"role": "user", "content": message})
+
+        # Fired when the browser goes away and Gradio closes this generator
+        cancel_token = CancellationToken()
+        reasoning = {"role": "assistant", "content": "", "metadata": {"title": "🧠 Reasoning Process"}}
+        answer = {"role": "assistant", "content": ""}
+        full_response = None
+        # Held here so the stream isn't finalized (and its token cancelled
+        # as "closed") before the GeneratorExit handler records the reason
+        events = self.groq_client.stream_response(session_messages, cancel_token=cancel_token)
+
+        try:
+            yield history, "", session_messages
+
+            for event, data in events:
+                if event == "reasoning":
+                    if not reasoning["content"]:
+                        history.append(reasoning)
+                    reasoning["content"] += data
+                elif event == "answer":
+                    if not answer["content"]:
+                        if not data.strip():
+                            continue
+                        history.append(answer)
+                        data = data.lstrip()
+                    answer["content"] += data
+                elif event == "done":
+                    full_response = data
+                    continue
+                yield history, "", session_messages
+
+            if full_response:
                 logger.info("Successfully received response from Groq")
-                return history + [(message, response)], ""
+                session_messages.append({"role": "assistant", "content": full_response})
+                yield history, "", session_messages
             else:
                 error_msg = "Failed to get a valid response from the AI service"
                 logger.error(error_msg)
-                return history + [(message, f"❌ {error_msg}")], ""
-
+                session_messages.pop()
+                yield history + [{"role": "assistant", "content": f"❌ {error_msg}"}], "", session_messages
+
+        except GeneratorExit:
+            if full_response is None:
+                cancel_token.cancel("disconnect")
+                session_messages.pop()
+            events.close()
+            raise
+        except AdmissionRejected as e:
+            logger.warning(str(e))
+            session_messages.pop()
+            yield history + [{"role": "assistant", "content": f"⏳ {BUSY_MESSAGE}"}], "", session_messages
         except Exception as e:
             error_msg = f"Error processing message: {str(e)}"
             logger.error(error_msg)
-            return history + [(message, f"❌ {error_msg}")], ""
+            # Drop the unanswered turn so the session stays user/assistant aligned
+            session_messages.pop()
+            yield history + [{"role": "assistant", "content": f"❌ {error_msg}"}], "", session_messages
 
 def create_interface():
     try:
@@ -68,6 +116,7 @@ def create_interface():
 
             chatbot = gr.Chatbot(
                 [],
+                type="messages",
                 show_label=False,
                 container=True,
                 height=450,
@@ -83,26 +132,38 @@ def create_interface():
                 )
                 submit = gr.Button("Send", scale=1)
 
+            # Per-session OpenAI-format conversation, extended turn by turn
+            session_messages = gr.State([])
+
             # Set up event handlers with error handling
-            def on_submit(message, history):
+            def on_submit(message, history, messages):
                 try:
-                    return chat.chat(message, history)
+                    yield from chat.chat(message, history, messages)
                 except Exception as e:
                     logger.error(f"Error in submit handler: {str(e)}")
-                    return history + [(message, f"❌ Error: {str(e)}")], ""
+                    yield history + [
+                        {"role": "user", "content": message},
+                        {"role": "assistant", "content": f"❌ Error: {str(e)}"}
+                    ], "", messages
 
             submit.click(
                 on_submit,
-                inputs=[msg, chatbot],
-                outputs=[chatbot, msg]
+                inputs=[msg, chatbot, session_messages],
+                outputs=[chatbot, msg, session_messages]
             ).then(lambda: "", None, msg)
 
             msg.submit(
                 on_submit,
-                inputs=[msg, chatbot],
-                outputs=[chatbot, msg]
+                inputs=[msg, chatbot, session_messages],
+                outputs=[chatbot, msg, session_messages]
             ).then(lambda: "", None, msg)
 
+        # Bound how many generations run at once and how many may wait
+        demo.queue(
+            default_concurrency_limit=int(os.getenv("GRADIO_CONCURRENCY_LIMIT", "16")),
+            max_size=int(os.getenv("GRADIO_MAX_QUEUE_SIZE", "256"))
+        )
+
         return demo
 
     except Exception as e:
@@ -0,0 +1,75 @@
+import threading
+import logging
+from typing import Callable, List, Optional
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCancelled(Exception):
+    """Raised when work is abandoned because its cancellation token fired."""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(f"Generation cancelled: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation signal shared between a caller and the work it
+    started.
+
+    Work registers cleanup with ``on_cancel`` (for example closing an HTTP
+    stream) and checks ``cancelled`` between steps; ``wait`` replaces
+    ``time.sleep`` so backoff delays end as soon as the token fires.
+    """
+
+    def __init__(self, metric_prefix: str = "cancellation"):
+        self.reason: Optional[str] = None
+        self.metric_prefix = metric_prefix
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run ``callback`` on cancellation, or right away if already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Fire the token. Returns False if it had already been cancelled."""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        metrics.increment(f"{self.metric_prefix}.{reason}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"Error in cancellation callback: {str(e)}")
+        return True
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled(self.reason)
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to ``timeout`` seconds; returns True if cancelled meanwhile."""
+        return self._event.wait(timeout)
+
+
+def raise_if_cancelled(token: Optional[CancellationToken]):
+    """Helper for optional tokens."""
+    if token is not None:
+        token.raise_if_cancelled()
@@ -2,23 +2,28 @@ import streamlit as st
 from typing import List, Dict, Optional, Tuple
 from groq_client import GroqClient
 from utils import manage_chat_history, format_message
+from cancellation import CancellationToken
+from profiling import profiled
+import logging
 import re
 
+logger = logging.getLogger(__name__)
+
 class ChatInterface:
     def __init__(self):
         try:
             self.groq_client = GroqClient()
-            print("GroqClient initialized successfully")
+            logger.info("GroqClient initialized successfully")
         except Exception as e:
             st.error(f"Failed to initialize GroqClient: {str(e)}")
-            print(f"GroqClient initialization error: {str(e)}")
+            logger.error(f"GroqClient initialization error: {str(e)}")
             raise
 
     def initialize_session_state(self):
         """Initialize Streamlit session state variables."""
         if "messages" not in st.session_state:
             st.session_state.messages = []
-            print("Initialized empty messages list in session state")
+            logger.debug("Initialized empty messages list in session state")
         if "processing" not in st.session_state:
             st.session_state.processing = False
         if "current_response" not in st.session_state:
@@ -75,9 +80,13 @@ class ChatInterface:
             message
         )
 
+    @profiled("chat_interface_message")
     def process_pending_message(self) -> None:
         """Process any pending message in the session state."""
         if hasattr(st.session_state, 'pending_message') and st.session_state.processing:
+            cancel_token = CancellationToken()
+            st.session_state.active_generation = cancel_token
+            completed = False
             try:
                 messages = [
                     {
@@ -96,7 +105,7 @@ class ChatInterface:
                     typing_placeholder.markdown("🤔 Thinking...")
 
                     # Initialize the stream
-                    response_stream = self.groq_client.generate_reasoning_stream(messages)
+                    response_stream = self.groq_client.generate_reasoning_stream(messages, cancel_token=cancel_token)
 
                     def format_thinking(text):
                         """Format thinking content with proper styling."""
@@ -202,12 +211,16 @@ class ChatInterface:
 
                 # Add the final response to chat history
                 self.add_message("assistant", st.session_state.current_response)
+                completed = True
 
             except Exception as e:
                 error_msg = f"Error processing message: {str(e)}"
-                print(f"Error in process_pending_message: {error_msg}")
+                logger.error(f"Error in process_pending_message: {error_msg}")
                 st.error(error_msg)
             finally:
+                # Streamlit stops the run on rerun or disconnect; close the stream
+                if not completed:
+                    cancel_token.cancel("interrupted")
                 st.session_state.processing = False
                 if hasattr(st.session_state, 'pending_message'):
                     delattr(st.session_state, 'pending_message')
@@ -215,6 +228,9 @@ class ChatInterface:
     def on_message_submit(self, user_message: str):
         """Handle message submission."""
         if user_message.strip():
+            active_generation = st.session_state.get("active_generation")
+            if active_generation is not None:
+                active_generation.cancel("new_submission")
             self.add_message("user", user_message)
             st.session_state.processing = True
             st.session_state.pending_message = user_message
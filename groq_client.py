@@ -3,13 +3,25 @@ import time
 import json
 import re
 from openai import OpenAI
-from typing import List, Dict, Generator, Union, Optional
+from typing import List, Dict, Generator, Union, Optional, Tuple
 from search_manager import SearchManager
-from utils import handle_rate_limit
+from utils import handle_rate_limit, ThinkTagParser, normalize_query
+from hedging import hedger
+from cancellation import CancellationToken, GenerationCancelled, raise_if_cancelled
+from metrics import metrics
+from routing import ModelRouter, ModelTier, REASONING
+from singleflight import SingleFlight
+from prefetch import prefetcher
+from local_index import local_index, IndexSession
+from profiling import profiled
+from admission import admission, AdmissionRejected, Permit, BUSY_MESSAGE, INTERACTIVE, CLASSIFICATION
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Shared by every GroqClient in the process
+_topic_flight = SingleFlight("search_topic")
+
 class GroqClient:
     def __init__(self):
         api_key = os.getenv("GROQ_API_KEY", "").strip()
@@ -19,11 +31,17 @@ class GroqClient:
         try:
             self.client = OpenAI(
                 api_key=api_key,
-                base_url="https://api.groq.com/openai/v1",
+                base_url=os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1"),
                 timeout=30.0
             )
-            self.model = "deepseek-r1-distill-llama-70b"  
+            # Route requests between a fast and a reasoning model tier
+            self.router = ModelRouter.from_env()
+            self.model = self.router.tiers[REASONING].model
             self.search_manager = SearchManager()
+            # Passages of fetched results, consulted before searching again
+            self.local_index = local_index
+            # Opt-in request hedging, configured via GROQ_HEDGE_* variables
+            self.hedger = hedger
             logger.info("Initialized Groq client successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Groq client: {str(e)}")
@@ -41,26 +59,12 @@ class GroqClient:
 
         return clean_text, thinking
 
-    @handle_rate_limit
-    def generate_response(self, messages: List[Dict]) -> str:
-        """Generates a response using the Groq API with retries and reasoning display."""
-        max_retries = 3
-        retry_delay = 1
-
-        for attempt in range(max_retries):
-            try:
-                if not messages or not isinstance(messages, list):
-                    return "Invalid message format. Please try again."
-
-                # Get the user's query from the last message
-                query = messages[-1]["content"].strip()
-                if not query:
-                    return "Please enter a message to start the conversation."
-
-                # Add system message to encourage natural paragraph-based reasoning
-                system_message = {
-                    "role": "system",
-                    "content": """You are a thoughtful AI assistant that explains your reasoning process naturally and clearly. For every response:
+    def build_messages(self, messages: List[Dict]) -> List[Dict]:
+        """Prepend the reasoning system prompt to the conversation."""
+        # Add system message to encourage natural paragraph-based reasoning
+        system_message = {
+            "role": "system",
+            "content": """You are a thoughtful AI assistant that explains your reasoning process naturally and clearly. For every response:
 
 1. Write your thoughts in clear, well-spaced paragraphs under a <think> tag
 2. Start with "Okay, so the user is asking..." and explain your approach
@@ -81,43 +85,353 @@ After considering all these factors, I can now formulate a clear response.
 </think>
 
 [Your final response here]"""
-                }
+        }
 
-                # Add system message to the beginning of the conversation
-                messages_with_system = [system_message] + messages
+        # Add system message to the beginning of the conversation
+        return [system_message] + messages
 
-                # Generate response with retry logic
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages_with_system,
-                    temperature=0.6,  # Adjusted for more focused responses
-                    max_tokens=2000,
-                    top_p=0.95,  # Added for better response quality
-                    timeout=30.0
-                )
+    @profiled("generate_response")
+    @handle_rate_limit
+    def generate_response(self, messages: List[Dict], tier: Optional[str] = None, cancel_token: Optional[CancellationToken] = None, model_tier: Optional[ModelTier] = None) -> str:
+        """
+        Generates a response using the Groq API with retries and reasoning display.
+
+        ``tier`` overrides the routed model tier ("fast" or "reasoning") and
+        raises ValueError if unknown; ``model_tier`` is a tier already routed
+        for this request, used without routing again. Raises
+        GenerationCancelled once ``cancel_token`` fires.
+        """
+        max_retries = 3
+        retry_delay = 1
+
+        if not messages or not isinstance(messages, list) or not isinstance(messages[-1], dict):
+            return "Invalid message format. Please try again."
+
+        # Get the user's query from the last message
+        query = str(messages[-1].get("content") or "").strip()
+        if not query:
+            return "Please enter a message to start the conversation."
 
-                if not response or not response.choices:
+        # Routed once: an unknown tier raises ValueError, which no retry fixes
+        if model_tier is None:
+            model_tier = self.router.route(messages, tier=tier)
+        messages_with_system = self.build_messages(messages)
+
+        for attempt in range(max_retries):
+            try:
+                raise_if_cancelled(cancel_token)
+
+                # Generate response with retry logic
+                content = self.complete(messages_with_system, model_tier, cancel_token)
+                if content is None:
                     return "Sorry, I couldn't generate a response. Please try again."
 
-                return response.choices[0].message.content
+                return content
 
+            except GenerationCancelled:
+                raise
+            except AdmissionRejected as e:
+                # Retrying would only add to the backlog
+                logger.warning(str(e))
+                return BUSY_MESSAGE
             except Exception as e:
                 logger.error(f"Attempt {attempt + 1} failed: {str(e)}")
                 if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))  # Exponential backoff
+                    # Exponential backoff, cut short by cancellation
+                    if cancel_token is not None:
+                        if cancel_token.wait(retry_delay * (attempt + 1)):
+                            raise GenerationCancelled(cancel_token.reason)
+                    else:
+                        time.sleep(retry_delay * (attempt + 1))
                     continue
                 return f"I'm having trouble connecting right now. Please try again in a moment. Error: {str(e)}"
 
         return "Service is temporarily unavailable. Please try again later."
 
-    def generate_reasoning_stream(self, messages: List[Dict]) -> Generator:
-        """Generates a streamed response showing the reasoning process."""
-        return self.generate_response(messages)
+    def generate_reasoning_stream(self, messages: List[Dict], tier: Optional[str] = None, cancel_token: Optional[CancellationToken] = None) -> Generator:
+        """Generates a streamed response showing the reasoning process.
+
+        Returns the raw completion stream; each chunk carries a
+        ``choices[0].delta.content`` fragment. Cancelling ``cancel_token``
+        closes the stream.
+        """
+        raise_if_cancelled(cancel_token)
+        model_tier = self.router.route(messages, tier=tier)
+        permit = admission.acquire(INTERACTIVE, cancel_token=cancel_token)
+        try:
+            stream = self.client.chat.completions.create(
+                stream=True,
+                **self.completion_request(self.build_messages(messages), model_tier)
+            )
+        except Exception:
+            permit.release()
+            raise
+        if cancel_token is not None:
+            cancel_token.on_cancel(stream.close)
+        return self._release_after(stream, permit)
+
+    @staticmethod
+    def _release_after(stream, permit: Permit) -> Generator:
+        """Pass through ``stream``, freeing its admission slot once it ends or is closed."""
+        try:
+            yield from stream
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            permit.release()
+
+    def completion_request(self, messages_with_system: List[Dict], tier: Optional[ModelTier] = None) -> Dict:
+        """Keyword arguments for an answer-generating completion call on ``tier``."""
+        tier = tier or self.router.tiers[REASONING]
+        return {
+            "model": tier.model,
+            "messages": messages_with_system,
+            "temperature": tier.temperature,
+            "max_tokens": tier.max_tokens,
+            "top_p": tier.top_p,
+            "timeout": 30.0
+        }
+
+    def complete(self, messages_with_system: List[Dict], tier: Optional[ModelTier] = None, cancel_token: Optional[CancellationToken] = None, priority: int = INTERACTIVE) -> Optional[str]:
+        """Run a completion and return its content, or None if it came back empty."""
+        if self.hedger or cancel_token is not None:
+            # Hedging races on the first token and cancellation closes the
+            # HTTP stream, so both collect a stream instead
+            return "".join(self.open_completion_stream(messages_with_system, tier, cancel_token, priority)) or None
+
+        tier = tier or self.router.tiers[REASONING]
+        with admission.admit(priority):
+            metrics.increment("llm.requests")
+            started = time.monotonic()
+            response = self.client.chat.completions.create(**self.completion_request(messages_with_system, tier))
+        metrics.observe(f"llm.tier.{tier.name}.latency_seconds", time.monotonic() - started)
+        if not response or not response.choices:
+            return None
+        return response.choices[0].message.content
+
+    def open_completion_stream(self, messages_with_system: List[Dict], tier: Optional[ModelTier] = None, cancel_token: Optional[CancellationToken] = None, priority: int = INTERACTIVE) -> Generator[str, None, None]:
+        """
+        Start a streaming completion and return once its first delta arrived.
+
+        The request first waits for an admission slot at ``priority`` and
+        holds it until the stream ends; AdmissionRejected is raised if none
+        frees up in time. With hedging enabled a second request is raced
+        against a slow first token and the loser's stream is closed.
+        Cancelling ``cancel_token`` closes the stream and makes the
+        generator raise GenerationCancelled.
+        """
+        raise_if_cancelled(cancel_token)
+        tier = tier or self.router.tiers[REASONING]
+        request = self.completion_request(messages_with_system, tier)
+        if not self.hedger:
+            return self._open_stream(request, tier, cancel_token, priority)
+
+        # The primary is admitted before the hedge timer starts, so time in
+        # the admission queue never fires a hedge. The hedge itself only
+        # runs on a slot that is free right now; it never joins the queue.
+        permit = admission.acquire(priority, cancel_token=cancel_token)
+
+        def attempt_request(attempt):
+            if attempt.name == "primary":
+                return self._open_stream(request, tier, attempt, priority, permit)
+            hedge_permit = admission.try_acquire(priority)
+            if hedge_permit is None:
+                metrics.increment("llm.hedge.no_slot")
+                raise AdmissionRejected("hedge_no_slot")
+            return self._open_stream(request, tier, attempt, priority, hedge_permit)
+
+        try:
+            return self.hedger.run(
+                attempt_request,
+                latency_metric=f"llm.tier.{tier.name}.ttft_seconds",
+                cancel_token=cancel_token
+            )
+        except BaseException:
+            permit.release()
+            raise
+
+    def _open_stream(self, request: Dict, tier: ModelTier, token: Optional[CancellationToken] = None, priority: int = INTERACTIVE, permit: Optional[Permit] = None) -> Generator[str, None, None]:
+        # Queue time is excluded from TTFT so it doesn't skew hedge delays
+        if permit is None:
+            permit = admission.acquire(priority, cancel_token=token)
+        metrics.increment("llm.requests")
+        started = time.monotonic()
+        try:
+            stream = self.client.chat.completions.create(stream=True, **request)
+            if token is not None:
+                token.on_cancel(stream.close)
+
+            deltas = self._iter_deltas(stream, permit)
+            first = next(deltas, None)
+        except Exception as e:
+            permit.release()
+            if token is not None and token.cancelled:
+                raise GenerationCancelled(token.reason) from e
+            raise
+
+        if token is None or not token.cancelled:
+            elapsed = time.monotonic() - started
+            metrics.observe("llm.ttft_seconds", elapsed)
+            metrics.observe(f"llm.tier.{tier.name}.ttft_seconds", elapsed)
+        return self._chain_deltas(first, deltas, token)
+
+    @staticmethod
+    def _iter_deltas(stream, permit: Optional[Permit] = None) -> Generator[str, None, None]:
+        try:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            if permit is not None:
+                permit.release()
+
+    @staticmethod
+    def _chain_deltas(first: Optional[str], deltas: Generator[str, None, None], token: Optional[CancellationToken] = None) -> Generator[str, None, None]:
+        streamed = 0
+        try:
+            if first is not None:
+                streamed += 1
+                yield first
+            for delta in deltas:
+                if token is not None and token.cancelled:
+                    break
+                streamed += 1
+                yield delta
+            raise_if_cancelled(token)
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            # Closing the stream from another thread surfaces as a read error
+            if token is not None and token.cancelled:
+                raise GenerationCancelled(token.reason) from e
+            raise
+        finally:
+            deltas.close()
+            if token is not None and token.cancelled:
+                metrics.increment("llm.cancelled_streams")
+                metrics.increment("llm.cancelled_stream_tokens", streamed)
+
+    def stream_completion(self, messages_with_system: List[Dict], tier: Optional[ModelTier] = None, cancel_token: Optional[CancellationToken] = None) -> Generator[str, None, None]:
+        """Stream content deltas for an already prepared message list.
+
+        The underlying HTTP stream is closed when the generator is closed,
+        so a consumer that stops early releases the connection right away.
+        """
+        yield from self.open_completion_stream(messages_with_system, tier, cancel_token)
+
+    @profiled("stream_response")
+    def stream_response(self, messages: List[Dict], search: bool = False, tier: Optional[str] = None, cancel_token: Optional[CancellationToken] = None, search_fallback: bool = True, index_session: Optional[IndexSession] = None) -> Generator[Tuple[str, object], None, None]:
+        """
+        Stream a response as ``(event, data)`` pairs, optionally forcing a model ``tier``.
+
+        Events arrive in pipeline order so each stage can be shown as soon
+        as it is ready:
+
+        - ``"route"``: the model tier and, in search mode, the search topic
+        - ``"search_results"``: list of results (search mode only)
+        - ``"reasoning"`` and ``"answer"``: text deltas split on <think> tags
+        - ``"timings"``: seconds from the start to each stage reached
+        - ``"done"``: the full raw response text, always last
+
+        A failed search step falls back to an answer without search unless
+        ``search_fallback`` is False, in which case the error is raised.
+        ``index_session`` is the conversation's handle on the local index
+        (see ``run_search``).
 
-    def determine_search_topic(self, query: str) -> Dict:
+        Cancelling ``cancel_token`` closes the upstream stream and raises
+        GenerationCancelled; closing the generator early cancels the token.
+        """
+        if not messages or not isinstance(messages, list):
+            raise ValueError("Invalid message format")
+        if not messages[-1].get("content", "").strip():
+            raise ValueError("Empty message")
+
+        started = time.monotonic()
+        timings = {}
+
+        def reached(stage: str):
+            if stage not in timings:
+                timings[stage] = time.monotonic() - started
+                metrics.observe(f"pipeline.{stage}_seconds", timings[stage])
+
+        try:
+            messages_with_system = None
+            deltas = None
+            model_tier = self.router.route(messages, search=search, tier=tier)
+            route = {"tier": model_tier.name, "model": model_tier.model, "search": search}
+            if search:
+                try:
+                    search_params = self.determine_search_topic(messages[-1]["content"].strip(), cancel_token)
+                    raise_if_cancelled(cancel_token)
+                    route.update(
+                        topic=search_params["topic"],
+                        days=search_params.get("days", 3) if search_params["topic"] == "news" else None
+                    )
+                    reached("route")
+                    yield "route", route
+
+                    search_results = self.run_search(messages, search_params, cancel_token, index_session)
+                    messages_with_system = self.build_grounded_messages(messages, search_params, search_results)
+                except GenerationCancelled:
+                    raise
+                except Exception as e:
+                    if not search_fallback:
+                        raise
+                    logger.error(f"Search failed: {str(e)}")  # Fall back to a normal response
+                else:
+                    reached("search_results")
+                    yield "search_results", search_results
+            if "route" not in timings:
+                reached("route")
+                yield "route", route
+            if messages_with_system is None:
+                messages_with_system = self.build_messages(messages)
+
+            parser = ThinkTagParser()
+            full_response = []
+            deltas = self.stream_completion(messages_with_system, model_tier, cancel_token)
+            for delta in deltas:
+                full_response.append(delta)
+                for event in parser.feed(delta):
+                    reached(f"first_{event[0]}")
+                    yield event
+            for event in parser.flush():
+                reached(f"first_{event[0]}")
+                yield event
+
+            reached("done")
+            yield "timings", dict(timings)
+            yield "done", "".join(full_response)
+        except GeneratorExit:
+            if cancel_token is not None:
+                cancel_token.cancel("closed")
+            if deltas is not None:
+                deltas.close()
+            raise
+
+    def determine_search_topic(self, query: str, cancel_token: Optional[CancellationToken] = None) -> Dict:
         """
         Determine appropriate search parameters based on query context.
+
+        Concurrent calls for the same normalised query share one LLM call.
         """
+        raise_if_cancelled(cancel_token)
+        result = _topic_flight.do(
+            normalize_query(query),
+            lambda: self._determine_search_topic(query),
+            cancel_token=cancel_token
+        )
+        raise_if_cancelled(cancel_token)
+        return dict(result)
+
+    def _determine_search_topic(self, query: str) -> Dict:
         # First, ask the LLM to analyze the query
         system_message = {
             "role": "system",
@@ -143,67 +457,111 @@ After considering all these factors, I can now formulate a clear response.
         }
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    system_message,
-                    {"role": "user", "content": query}
-                ],
-                temperature=0.1
-            )
+            # Classification yields to interactive calls; if no slot frees up
+            # in time the default topic below is used
+            with admission.admit(CLASSIFICATION):
+                # A small JSON classification doesn't need the reasoning model
+                response = self.client.chat.completions.create(
+                    model=self.router.utility_tier().model,
+                    messages=[
+                        system_message,
+                        {"role": "user", "content": query}
+                    ],
+                    temperature=0.1
+                )
 
             result = json.loads(response.choices[0].message.content)
-            logger.info(f"Search topic determination: {result}")
+            logger.info("Search topic determined", extra={"event": "search.topic", "topic": result.get("topic")})
+            logger.debug("Search topic determination: %s", result)
             return result
         except Exception as e:
             logger.error(f"Error determining search topic: {e}")
             return {"topic": "general", "reasoning": "Failed to determine topic, using default"}
 
-    def generate_response_with_search(self, messages: List[Dict]) -> str:
-        """Generates a response using web search results for enhanced accuracy."""
-        try:
-            if not messages or not isinstance(messages, list):
-                return "Invalid message format. Please try again."
-
-            # Get the user's query from the last message
-            query = messages[-1]["content"].strip()
-            if not query:
-                return "Please enter a message to start the conversation."
+    def build_search_messages(self, messages: List[Dict], cancel_token: Optional[CancellationToken] = None, index_session: Optional[IndexSession] = None) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Run the search step for the latest user message and build the
+        grounded prompt. Returns the message list and the raw search results.
+        """
+        query = messages[-1]["content"].strip()
 
-            # Determine search parameters
-            search_params = self.determine_search_topic(query)
-            logger.info(f"Using search parameters: {search_params}")
+        # Determine search parameters
+        search_params = self.determine_search_topic(query, cancel_token)
+        raise_if_cancelled(cancel_token)
+        logger.debug("Using search parameters: %s", search_params)
 
-            # Perform web search with better error handling
-            try:
-                logger.info(f"Performing Tavily search for query: {query}")
-                search_results = self.search_manager.search(
-                    query,
-                    topic=search_params["topic"],
-                    days=search_params.get("days", 3) if search_params["topic"] == "news" else None
-                )
-                logger.info(f"Successfully retrieved {len(search_results) if search_results else 0} results")
-
-                if not search_results:
-                    logger.warning("No search results found")
-                    search_context = "No relevant search results found."
-                else:
-                    # Create a context from search results with proper null checks
-                    search_results_text = []
-                    for i, result in enumerate(search_results[:3], 1):
-                        if isinstance(result, dict):
-                            content = result.get('content', 'No content available')
-                            url = result.get('url', '#')
-                            search_results_text.append(f"Source {i}:\nContent: {content}\nURL: {url}")
-                    search_context = "\n\n".join(search_results_text) if search_results_text else "No relevant search results found."
-            except Exception as e:
-                logger.error(f"Search failed: {str(e)}")
-                return self.generate_response(messages)  # Fallback to normal response
+        search_results = self.run_search(messages, search_params, cancel_token, index_session)
+        return self.build_grounded_messages(messages, search_params, search_results), search_results
 
-            # Add system message to encourage natural paragraph-based reasoning
-            system_message = {
-                "role": "system",
-                "content": f"""You are a thoughtful AI assistant that explains your reasoning process naturally and clearly. 
+    def run_search(self, messages: List[Dict], search_params: Dict, cancel_token: Optional[CancellationToken] = None, index_session: Optional[IndexSession] = None) -> List[Dict]:
+        """
+        Find results for the latest user message with the given topic
+        parameters: from the local index of earlier results when it covers
+        the question with fresh enough content, otherwise from the web.
+        ``index_session`` scopes the index to this conversation's fetches
+        (LOCAL_INDEX_SCOPE=session) and resolves positional references
+        ("source 2") against the set it was last shown; the returned set
+        becomes that set on every path, local hits included.
+        """
+        query = messages[-1]["content"].strip()
+
+        local_results = self.local_index.lookup(
+            query,
+            topic=search_params["topic"],
+            session=index_session,
+            # "the second source" only means something in a follow-up
+            references=len(messages) > 1
+        )
+        if local_results:
+            logger.info("Search answered from local index", extra={"event": "local_index.hit", "count": len(local_results)})
+            if index_session is not None:
+                index_session.recent_results = local_results
+            return local_results
+
+        # Perform web search with better error handling
+        logger.debug("Performing search for query: %s", query)
+        search_results = self.search_manager.search(
+            query,
+            topic=search_params["topic"],
+            days=search_params.get("days", 3) if search_params["topic"] == "news" else None,
+            cancel_token=cancel_token
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Retrieved results: %s", [result.get('url') for result in search_results or [] if isinstance(result, dict)])
+        if search_results:
+            self.local_index.add(search_results, topic=search_params["topic"], session=index_session)
+        if index_session is not None:
+            index_session.recent_results = search_results or []
+
+        # Warm the cache for likely follow-ups while the answer is generated
+        prefetcher.schedule(
+            query,
+            search_results or [],
+            messages,
+            topic=search_params["topic"],
+            days=search_params.get("days", 3) if search_params["topic"] == "news" else None
+        )
+        return search_results
+
+    def build_grounded_messages(self, messages: List[Dict], search_params: Dict, search_results: List[Dict]) -> List[Dict]:
+        """Build the prompt that grounds the answer on ``search_results``."""
+        if not search_results:
+            logger.warning("No search results found")
+            search_context = "No relevant search results found."
+        else:
+            # Create a context from search results with proper null checks
+            search_results_text = []
+            for i, result in enumerate(search_results[:3], 1):
+                if isinstance(result, dict):
+                    content = result.get('content', 'No content available')
+                    url = result.get('url', '#')
+                    search_results_text.append(f"Source {i}:\nContent: {content}\nURL: {url}")
+            search_context = "\n\n".join(search_results_text) if search_results_text else "No relevant search results found."
+
+        # Add system message to encourage natural paragraph-based reasoning
+        system_message = {
+            "role": "system",
+            "content": f"""You are a thoughtful AI assistant that explains your reasoning process naturally and clearly. 
 First, analyze these search results to provide accurate, up-to-date information:
 
 {search_context}
@@ -232,34 +590,59 @@ After analyzing these search results, I can now formulate a comprehensive respon
 </think>
 
 [Your final response here with proper source citations]"""
-            }
+        }
+
+        # Add system message to the beginning of the conversation
+        return [system_message] + messages
+
+    @profiled("generate_response_with_search")
+    def generate_response_with_search(self, messages: List[Dict], tier: Optional[str] = None, cancel_token: Optional[CancellationToken] = None, index_session: Optional[IndexSession] = None) -> str:
+        """
+        Generates a response using web search results for enhanced accuracy.
+
+        ``index_session`` is as for ``run_search``. Raises
+        GenerationCancelled once ``cancel_token`` fires.
+        """
+        try:
+            if not messages or not isinstance(messages, list):
+                return "Invalid message format. Please try again."
+
+            # Get the user's query from the last message
+            query = messages[-1]["content"].strip()
+            if not query:
+                return "Please enter a message to start the conversation."
+
+            try:
+                messages_with_system, search_results = self.build_search_messages(messages, cancel_token, index_session)
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"Search failed: {str(e)}")
+                return self.generate_response(messages, tier=tier, cancel_token=cancel_token)  # Fallback to normal response
 
             # Store the raw search results for later use
             self.last_search_results = search_results
 
-            # Add system message to the beginning of the conversation
-            messages_with_system = [system_message] + messages
-
             try:
                 # Generate response with retry logic
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages_with_system,
-                    temperature=0.6,
-                    max_tokens=2000,
-                    top_p=0.95,
-                    timeout=30.0
-                )
-
-                if not response or not response.choices:
+                model_tier = self.router.route(messages, search=True, tier=tier)
+                content = self.complete(messages_with_system, model_tier, cancel_token)
+                if content is None:
                     return "Sorry, I couldn't generate a response. Please try again."
 
-                return response.choices[0].message.content
+                return content
 
+            except GenerationCancelled:
+                raise
+            except AdmissionRejected as e:
+                logger.warning(str(e))
+                return BUSY_MESSAGE
             except Exception as e:
                 logger.error(f"API call failed: {str(e)}")
-                return self.generate_response(messages)  # Fallback to normal response
+                return self.generate_response(messages, cancel_token=cancel_token, model_tier=model_tier)  # Fallback to normal response
 
+        except GenerationCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error in generate_response_with_search: {str(e)}")
             return "I encountered an error while searching. Let me try answering without search results."
\ No newline at end of file
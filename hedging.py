@@ -0,0 +1,159 @@
+import os
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional, TypeVar
+from cancellation import CancellationToken
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Attempt(CancellationToken):
+    """
+    Handle for one of the racing requests.
+
+    The request function registers cleanup callbacks (e.g. closing an HTTP
+    stream) with ``on_cancel``; they run as soon as the attempt loses.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(metric_prefix="llm.hedge.cancelled")
+        self.name = name
+
+
+class HedgeBudget:
+    """
+    Token bucket limiting hedges to a fraction of primary requests.
+
+    Each primary request earns ``ratio`` tokens (up to ``burst``) and each
+    hedge spends one, so during an outage hedging cannot add more than
+    ``ratio`` extra load.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+class Hedger:
+    """
+    Run a request and, if it hasn't produced its first response within a
+    percentile-based delay, race an identical second request against it.
+    """
+
+    def __init__(
+        self,
+        latency_metric: str,
+        percentile: float = 95.0,
+        default_delay: float = 2.0,
+        min_delay: float = 0.25,
+        max_delay: float = 10.0,
+        min_samples: int = 20,
+        budget: Optional[HedgeBudget] = None,
+        max_workers: int = 32,
+        metric_prefix: str = "llm.hedge"
+    ):
+        self.latency_metric = latency_metric
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.budget = budget or HedgeBudget()
+        self.metric_prefix = metric_prefix
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    @classmethod
+    def from_env(cls, latency_metric: str) -> Optional["Hedger"]:
+        """Build a Hedger from GROQ_HEDGE_* variables, or None when disabled."""
+        if os.getenv("GROQ_HEDGE_ENABLED", "").strip().lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            latency_metric,
+            percentile=float(os.getenv("GROQ_HEDGE_PERCENTILE", "95")),
+            default_delay=float(os.getenv("GROQ_HEDGE_DEFAULT_DELAY", "2.0")),
+            min_delay=float(os.getenv("GROQ_HEDGE_MIN_DELAY", "0.25")),
+            max_delay=float(os.getenv("GROQ_HEDGE_MAX_DELAY", "10.0")),
+            budget=HedgeBudget(
+                ratio=float(os.getenv("GROQ_HEDGE_BUDGET_RATIO", "0.1")),
+                burst=float(os.getenv("GROQ_HEDGE_BUDGET_BURST", "10"))
+            ),
+            max_workers=int(os.getenv("GROQ_HEDGE_MAX_WORKERS", "32"))
+        )
+
+    def hedge_delay(self, latency_metric: Optional[str] = None) -> float:
+        """Delay before hedging, from the observed latency distribution."""
+        latency_metric = latency_metric or self.latency_metric
+        if metrics.sample_count(latency_metric) < self.min_samples:
+            delay = self.default_delay
+        else:
+            delay = metrics.percentile(latency_metric, self.percentile)
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def run(self, request: Callable[[Attempt], T], latency_metric: Optional[str] = None, cancel_token: Optional[CancellationToken] = None) -> T:
+        """
+        Call ``request`` and return the first successful result.
+
+        ``request`` must return once the first response (or first token) has
+        arrived. The losing attempt is cancelled; if both fail, the primary's
+        error is raised. ``latency_metric`` overrides the distribution the
+        hedge delay is taken from. Cancelling ``cancel_token`` cancels every
+        attempt still running.
+        """
+        self.budget.record_request()
+        primary = Attempt("primary")
+        attempts = {self.executor.submit(request, primary): primary}
+        if cancel_token is not None:
+            cancel_token.on_cancel(lambda: primary.cancel(cancel_token.reason))
+
+        done, _ = wait(attempts, timeout=self.hedge_delay(latency_metric))
+        if not done and not (cancel_token is not None and cancel_token.cancelled):
+            if self.budget.try_acquire():
+                metrics.increment(f"{self.metric_prefix}.fired")
+                hedge = Attempt("hedge")
+                attempts[self.executor.submit(request, hedge)] = hedge
+                if cancel_token is not None:
+                    cancel_token.on_cancel(lambda: hedge.cancel(cancel_token.reason))
+            else:
+                metrics.increment(f"{self.metric_prefix}.budget_exhausted")
+
+        pending = set(attempts)
+        errors = {}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt = attempts[future]
+                if future.exception() is not None:
+                    errors[attempt.name] = future.exception()
+                    continue
+
+                # Cleanup a loser registers after this point runs immediately
+                for other in attempts.values():
+                    if other is not attempt:
+                        other.cancel("hedge_lost")
+                if attempt.name == "hedge":
+                    metrics.increment(f"{self.metric_prefix}.won")
+                return future.result()
+
+        raise errors.get("primary") or errors["hedge"]
+
+
+# Shared by every GroqClient in the process, so the hedge budget and worker
+# threads are per process rather than per session; None when disabled
+hedger = Hedger.from_env("llm.ttft_seconds")
@@ -0,0 +1,451 @@
+"""
+Concurrent-session load harness.
+
+Drives N simultaneous scripted chat sessions through the Streamlit app
+(``streamlit_app.main`` and ``ChatInterface``, via Streamlit's AppTest) or
+``app.GradioChat``, against local stand-ins for Groq and the search
+providers, and reports how latency, memory, render time and threads scale
+with N.
+
+Usage:
+    python loadtest.py --target streamlit --levels 1,2,4,8,16 --turns 3
+    python loadtest.py --target gradio --search --profile --json report.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import traceback
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import search_providers
+from search_providers import SearchProvider
+
+PROMPTS = [
+    "hi",
+    "What is the capital of Australia?",
+    "Explain why the sky is blue and compare it with sunsets on Mars",
+    "Tell me more about that",
+    "Who won the last World Cup?",
+    "How does a transformer neural network work, step by step?",
+]
+
+
+class StandInLLMHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible ``/chat/completions`` endpoint."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config = self.server.config
+        system_prompt = request.get("messages", [{}])[0].get("content", "")
+
+        if "JSON object" in system_prompt:
+            text = json.dumps({"topic": "general", "reasoning": "stand-in classifier"})
+        else:
+            reasoning = " ".join(["Okay, so the user is asking something. Let me think it through."] * config["reasoning_sentences"])
+            answer = " ".join(["This is a stand-in answer sentence."] * config["answer_sentences"])
+            text = f"<think>\n{reasoning}\n</think>\n\n{answer}"
+
+        time.sleep(config["ttft"] * random.uniform(0.8, 1.2))
+        if request.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            words = text.split(" ")
+            try:
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": "standin", "object": "chat.completion.chunk", "created": 0, "model": request.get("model"),
+                        "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(config["token_delay"])
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+            return
+
+        time.sleep(config["token_delay"] * len(text.split(" ")))
+        body = json.dumps({
+            "id": "standin", "object": "chat.completion", "created": 0, "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stand_in_llm(ttft: float, token_delay: float, reasoning_sentences: int = 6, answer_sentences: int = 8) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInLLMHandler)
+    server.daemon_threads = True
+    server.config = {
+        "ttft": ttft,
+        "token_delay": token_delay,
+        "reasoning_sentences": reasoning_sentences,
+        "answer_sentences": answer_sentences,
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class StandInSearchProvider(SearchProvider):
+    """Search provider returning synthetic results after a fixed delay."""
+
+    name = "standin"
+
+    def __init__(self, delay: float = 0.3, content_size: int = 1500):
+        self.delay = delay
+        self.content_size = content_size
+
+    def search(self, query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None) -> List[Dict]:
+        time.sleep(self.delay * random.uniform(0.8, 1.2))
+        return [
+            self.normalize(
+                f"Result {i} for {query}",
+                f"https://example.com/{abs(hash(query)) % 10000}/{i}",
+                ("Synthetic page content. " * (self.content_size // 24))[:self.content_size]
+            )
+            for i in range(max_results)
+        ]
+
+
+def read_rss_bytes() -> int:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        # ru_maxrss is a peak, in KiB on Linux and bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+class ResourceSampler:
+    """
+    Background sampler for RSS and thread count. With ``profile`` set it
+    also takes statistical stack samples of every other thread.
+    """
+
+    def __init__(self, interval: float = 0.1, profile: bool = False):
+        self.interval = interval
+        self.profile = profile
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self.samples = 0
+        self.hot_frames = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, read_rss_bytes())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            if not self.profile:
+                continue
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                code = frame.f_code
+                self.hot_frames[f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"] += 1
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))]
+
+
+class StreamlitMainDriver:
+    """One scripted session through ``streamlit_app.main``."""
+
+    @staticmethod
+    def shared():
+        """State shared by every session in a level; each AppTest is its own session."""
+        return None
+
+    def __init__(self, search: bool, timeout: float, shared=None):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py"), default_timeout=timeout)
+        self.app.run()
+        if search:
+            self.app.toggle[0].set_value(True).run()
+
+    def turn(self, prompt: str):
+        self.app.chat_input[0].set_value(prompt).run()
+        self.check()
+
+    def rerun(self):
+        self.app.run()
+        self.check()
+
+    def check(self):
+        if self.app.exception:
+            raise RuntimeError(str(self.app.exception[0].value))
+
+
+def _chat_interface_script():
+    import streamlit as st
+    from chat_interface import ChatInterface
+
+    if "chat" not in st.session_state:
+        st.session_state.chat = ChatInterface()
+    st.session_state.chat.initialize_session_state()
+    st.session_state.chat.create_interface()
+
+
+class ChatInterfaceDriver(StreamlitMainDriver):
+    """One scripted session through ``ChatInterface`` (search is not used)."""
+
+    def __init__(self, search: bool, timeout: float, shared=None):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_function(_chat_interface_script, default_timeout=timeout)
+        self.app.run()
+
+
+class GradioDriver:
+    """One scripted session through ``app.GradioChat``."""
+
+    @staticmethod
+    def shared():
+        """One GradioChat per level, shared by all sessions as in the served app."""
+        from app import GradioChat
+        return GradioChat()
+
+    def __init__(self, search: bool, timeout: float, shared=None):
+        self.chat = shared
+        self.history = []
+        self.session_messages = []
+
+    def turn(self, prompt: str):
+        for self.history, _, self.session_messages in self.chat.chat(prompt, self.history, self.session_messages):
+            pass
+        last = self.history[-1]["content"] if self.history else ""
+        if last.startswith("❌"):
+            raise RuntimeError(last)
+
+    def rerun(self):
+        # Gradio has no script rerun; measure re-serialising the history
+        json.dumps(self.history)
+
+
+DRIVERS = {
+    "streamlit": StreamlitMainDriver,
+    "chat_interface": ChatInterfaceDriver,
+    "gradio": GradioDriver,
+}
+
+
+def run_session(driver_class, session_id: int, turns: int, search: bool, timeout: float, shared=None) -> Dict:
+    result = {"latencies": [], "render_times": [], "errors": []}
+    try:
+        driver = driver_class(search, timeout, shared)
+        for turn in range(turns):
+            prompt = PROMPTS[(session_id + turn) % len(PROMPTS)]
+            started = time.perf_counter()
+            driver.turn(prompt)
+            result["latencies"].append(time.perf_counter() - started)
+
+            # A rerun with no input re-renders the whole history
+            started = time.perf_counter()
+            driver.rerun()
+            result["render_times"].append(time.perf_counter() - started)
+    except Exception as e:
+        result["errors"].append(f"{type(e).__name__}: {str(e)}")
+        traceback.print_exc()
+    return result
+
+
+def run_level(target: str, sessions: int, turns: int, search: bool, timeout: float, profile: bool, trace_memory: bool) -> Dict:
+    """Run ``sessions`` concurrent sessions and summarise the level."""
+    driver_class = DRIVERS[target]
+    rss_before = read_rss_bytes()
+    threads_before = threading.active_count()
+    cpu_before = time.process_time()
+    if trace_memory:
+        tracemalloc.start()
+        snapshot_before = tracemalloc.take_snapshot()
+
+    started = time.perf_counter()
+    with ResourceSampler(interval=0.01 if profile else 0.1, profile=profile) as sampler:
+        shared = driver_class.shared()
+        with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="session") as executor:
+            results = list(executor.map(
+                lambda session_id: run_session(driver_class, session_id, turns, search, timeout, shared),
+                range(sessions)
+            ))
+    wall = time.perf_counter() - started
+
+    latencies = [latency for result in results for latency in result["latencies"]]
+    render_times = [render for result in results for render in result["render_times"]]
+    errors = [error for result in results for error in result["errors"]]
+    cpu = time.process_time() - cpu_before
+
+    level = {
+        "sessions": sessions,
+        "turns_completed": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_seconds": wall,
+        "throughput_turns_per_second": len(latencies) / wall if wall else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "render_p50": percentile(render_times, 50),
+        "render_p95": percentile(render_times, 95),
+        "cpu_seconds": cpu,
+        "cpu_utilisation": cpu / wall if wall else 0.0,
+        "rss_before_mb": rss_before / 2 ** 20,
+        "rss_peak_mb": max(sampler.peak_rss, read_rss_bytes()) / 2 ** 20,
+        "rss_growth_mb": (max(sampler.peak_rss, read_rss_bytes()) - rss_before) / 2 ** 20,
+        "rss_growth_per_session_mb": (max(sampler.peak_rss, read_rss_bytes()) - rss_before) / 2 ** 20 / sessions,
+        "threads_before": threads_before,
+        "threads_peak": sampler.peak_threads,
+    }
+    if profile and sampler.samples:
+        level["hot_frames"] = [
+            {"frame": frame, "share": count / sampler.samples}
+            for frame, count in sampler.hot_frames.most_common(15)
+        ]
+    if trace_memory:
+        stats = tracemalloc.take_snapshot().compare_to(snapshot_before, "lineno")
+        tracemalloc.stop()
+        level["top_allocations"] = [
+            {"site": str(stat.traceback), "size_kb": stat.size_diff / 1024}
+            for stat in stats[:10]
+        ]
+    return level
+
+
+def find_saturation(levels: List[Dict]) -> Optional[int]:
+    """
+    First session count where throughput stops scaling (< 10% gain) or p95
+    latency exceeds twice the single-level baseline.
+    """
+    if not levels:
+        return None
+    baseline_p95 = levels[0]["latency_p95"] or 0.0
+    for previous, level in zip(levels, levels[1:]):
+        if level["errors"]:
+            return level["sessions"]
+        gain = level["throughput_turns_per_second"] / previous["throughput_turns_per_second"] if previous["throughput_turns_per_second"] else 0.0
+        if gain < 1.1 or (baseline_p95 and (level["latency_p95"] or 0.0) > 2 * baseline_p95):
+            return level["sessions"]
+    return None
+
+
+def format_report(report: Dict) -> str:
+    levels = report["levels"]
+    lines = [
+        f"Load test: target={report['target']} search={report['search']} turns/session={report['turns']}",
+        f"Stand-ins: ttft={report['ttft']}s token_delay={report['token_delay']}s search_delay={report['search_delay']}s",
+        "",
+        f"{'N':>4} {'turns/s':>8} {'p50 s':>7} {'p95 s':>7} {'render p95':>10} {'cpu %':>6} {'RSS MB':>8} {'+MB/sess':>8} {'threads':>7} {'errors':>6}",
+    ]
+    for level in levels:
+        lines.append(
+            f"{level['sessions']:>4} {level['throughput_turns_per_second']:>8.2f} "
+            f"{(level['latency_p50'] or 0):>7.2f} {(level['latency_p95'] or 0):>7.2f} "
+            f"{(level['render_p95'] or 0):>10.3f} {level['cpu_utilisation'] * 100:>6.0f} "
+            f"{level['rss_peak_mb']:>8.1f} {level['rss_growth_per_session_mb']:>8.2f} "
+            f"{level['threads_peak']:>7} {level['errors']:>6}"
+        )
+
+    # Saturation curve: throughput bars against session count
+    peak = max((level["throughput_turns_per_second"] for level in levels), default=0) or 1
+    lines += ["", "Throughput (turns/s) by concurrent sessions:"]
+    for level in levels:
+        bar = "#" * int(40 * level["throughput_turns_per_second"] / peak)
+        lines.append(f"{level['sessions']:>4} | {bar} {level['throughput_turns_per_second']:.2f}")
+
+    saturation = report.get("saturation_sessions")
+    lines.append("")
+    lines.append(f"Saturation at ~{saturation} concurrent sessions" if saturation else "No saturation within the tested levels")
+
+    for level in levels:
+        if level.get("hot_frames"):
+            lines += ["", f"Hot frames at N={level['sessions']} (share of samples, all threads):"]
+            lines += [f"  {frame['share']:6.1%}  {frame['frame']}" for frame in level["hot_frames"][:10]]
+        if level.get("top_allocations"):
+            lines += ["", f"Top allocation growth at N={level['sessions']}:"]
+            lines += [f"  {allocation['size_kb']:9.1f} KiB  {allocation['site']}" for allocation in level["top_allocations"]]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Concurrent chat-session load harness")
+    parser.add_argument("--target", choices=sorted(DRIVERS), default="streamlit")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Comma-separated concurrent session counts")
+    parser.add_argument("--turns", type=int, default=3, help="Chat turns per session")
+    parser.add_argument("--search", action="store_true", help="Enable web search in the sessions")
+    parser.add_argument("--ttft", type=float, default=0.3, help="Stand-in LLM time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Stand-in LLM delay per token (s)")
+    parser.add_argument("--search-delay", type=float, default=0.3, help="Stand-in search latency (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-run timeout for AppTest (s)")
+    parser.add_argument("--profile", action="store_true", help="Sample thread stacks for a CPU/wall profile")
+    parser.add_argument("--tracemalloc", action="store_true", help="Report top allocation growth per level")
+    parser.add_argument("--json", help="Also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    llm = start_stand_in_llm(args.ttft, args.token_delay)
+    os.environ["GROQ_API_KEY"] = "stand-in"
+    os.environ["GROQ_BASE_URL"] = f"http://127.0.0.1:{llm.server_address[1]}"
+    # Prefetching would issue extra stand-in searches and skew the numbers
+    os.environ.setdefault("PREFETCH_ENABLED", "0")
+    search_providers.providers_from_env = lambda: [StandInSearchProvider(args.search_delay)]
+
+    levels = []
+    for sessions in [int(level) for level in args.levels.split(",") if level.strip()]:
+        print(f"Running {sessions} concurrent session(s)...", file=sys.stderr)
+        levels.append(run_level(args.target, sessions, args.turns, args.search, args.timeout, args.profile, args.tracemalloc))
+
+    report = {
+        "target": args.target,
+        "search": args.search,
+        "turns": args.turns,
+        "ttft": args.ttft,
+        "token_delay": args.token_delay,
+        "search_delay": args.search_delay,
+        "levels": levels,
+        "saturation_sessions": find_saturation(levels),
+    }
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+    llm.shutdown()
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import os
+import re
+import math
+import time
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from metrics import metrics
+
+TERM_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = {
+    "a", "an", "and", "the", "this", "that", "these", "those", "what", "why", "how", "when", "where", "who",
+    "which", "is", "are", "was", "were", "be", "been", "in", "on", "of", "for", "to", "with", "from", "by",
+    "at", "as", "it", "its", "do", "does", "did", "about", "me", "tell", "more", "can", "you", "your", "i",
+    "my", "we", "our", "or", "not", "there", "their", "they", "them", "he", "she", "his", "her", "please",
+    "explain", "describe", "some", "any", "also", "than", "then", "so", "if", "would", "could", "should", "over",
+}
+
+ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5}
+
+# Back-references to a result the user was shown: "source 2", "result #3",
+# "that second link", "the 2nd source you cited". A bare "the first article"
+# is an ordinary question, not a reference.
+_ORDINAL = r"(first|second|third|fourth|fifth|\d+(?:st|nd|rd|th))"
+SOURCE_REFERENCE = re.compile(
+    r"\b(?:source|result|link)\s*#?\s*(\d+)\b"
+    rf"|\b(?:that|this)\s+{_ORDINAL}\s+(?:source|result|link)\b"
+    rf"|\bthe\s+{_ORDINAL}\s+(?:source|result|link)\s+(?:"
+    r"you\s+(?:cited|gave|showed|mentioned|listed|shared|linked|found)"
+    r"|above|(?:in|from)\s+(?:your|the)\s+(?:answer|results|list))",
+    re.IGNORECASE
+)
+
+# Words that only ask about the referenced result, not about a new subject
+REFERENCE_WORDS = {
+    "say", "says", "said", "summarize", "summarise", "summary", "read", "open", "cite", "cited", "gave",
+    "showed", "mentioned", "listed", "shared", "linked", "found", "above", "answer", "results", "list",
+    "detail", "details", "go", "into", "according", "source", "result", "link",
+}
+
+
+def terms(text: str) -> List[str]:
+    return [term for term in TERM_PATTERN.findall(text.lower()) if term not in STOP_WORDS and len(term) > 1]
+
+
+def split_passages(text: str, max_chars: int = 600) -> List[str]:
+    """Split page content into passages of whole sentences, up to ``max_chars`` each."""
+    passages = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?])\s+|\n{2,}", text or ""):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+
+class Passage:
+    __slots__ = ("url", "title", "text", "topic", "fetched_at", "terms", "length")
+
+    def __init__(self, url: str, title: str, text: str, topic: str, fetched_at: float):
+        self.url = url
+        self.title = title
+        self.text = text
+        self.topic = topic
+        self.fetched_at = fetched_at
+        self.terms = Counter(terms(f"{title} {text}"))
+        self.length = sum(self.terms.values())
+
+
+class IndexSession:
+    """
+    One conversation's handle on the shared index: which passages its own
+    searches fetched (most recent last, at most ``max_passages``) and the
+    result set it was last shown, against which "the second source" style
+    references resolve. Holds passage IDs only; the passages themselves
+    are stored once in the index.
+    """
+
+    def __init__(self, max_passages: int = 500):
+        self.max_passages = max_passages
+        self.recent_results: List[Dict] = []
+        self.passage_ids: "OrderedDict[str, None]" = OrderedDict()
+
+    def _touch(self, passage_id: str):
+        self.passage_ids[passage_id] = None
+        self.passage_ids.move_to_end(passage_id)
+        while len(self.passage_ids) > self.max_passages:
+            self.passage_ids.popitem(last=False)
+
+
+class LocalIndex:
+    """
+    In-memory lexical (BM25) index over passages of fetched search results.
+
+    Every search result added is split into passages and kept with its URL
+    and fetch time; the oldest passages are evicted beyond
+    ``max_passages``. ``lookup`` answers a query from the index when its
+    passages are fresh enough for the topic and cover every number and
+    every distinctive (high-IDF) term of the query plus enough of the rest,
+    so follow-up questions can be grounded without another web search.
+
+    One index holds the passages of the whole process. With ``scope``
+    "session" a lookup only sees passages fetched by the caller's own
+    IndexSession, so one user's searches never answer another's question;
+    with "global" every passage is eligible; "off" disables the index.
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, max_passages: int = 5000, passage_chars: int = 600, max_age: float = 3600.0, news_max_age: float = 300.0, min_coverage: float = 0.7, min_score: float = 1.0, required_idf: float = 1.0, scope: str = "session", session_max_passages: int = 500):
+        if scope not in ("session", "global", "off"):
+            raise ValueError(f"Unknown local index scope: {scope}")
+        self.scope = scope
+        self.max_passages = max_passages
+        self.session_max_passages = session_max_passages
+        self.passage_chars = passage_chars
+        self.max_age = max_age
+        self.news_max_age = news_max_age
+        self.min_coverage = min_coverage
+        self.min_score = min_score
+        self.required_idf = required_idf
+        self._passages: "OrderedDict[str, Passage]" = OrderedDict()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LocalIndex":
+        return cls(
+            max_passages=int(os.getenv("LOCAL_INDEX_MAX_PASSAGES", "5000")),
+            passage_chars=int(os.getenv("LOCAL_INDEX_PASSAGE_CHARS", "600")),
+            max_age=float(os.getenv("LOCAL_INDEX_MAX_AGE", "3600")),
+            news_max_age=float(os.getenv("LOCAL_INDEX_NEWS_MAX_AGE", "300")),
+            min_coverage=float(os.getenv("LOCAL_INDEX_MIN_COVERAGE", "0.7")),
+            required_idf=float(os.getenv("LOCAL_INDEX_REQUIRED_IDF", "1.0")),
+            scope=os.getenv("LOCAL_INDEX_SCOPE", "session").strip().lower(),
+            session_max_passages=int(os.getenv("LOCAL_INDEX_SESSION_MAX_PASSAGES", "500"))
+        )
+
+    def session(self) -> IndexSession:
+        """A new handle for one conversation."""
+        return IndexSession(self.session_max_passages)
+
+    def _unavailable(self, session: Optional[IndexSession]) -> bool:
+        # A session-scoped index has nothing to offer a caller without a session
+        return self.scope == "off" or (self.scope == "session" and session is None)
+
+    def __len__(self) -> int:
+        return len(self._passages)
+
+    def add(self, results: List[Dict], topic: str = "general", session: Optional[IndexSession] = None):
+        """Index fetched ``results``, recording their passages against ``session``."""
+        if self._unavailable(session):
+            return
+        fetched_at = time.time()
+        with self._lock:
+            for result in results or []:
+                if not isinstance(result, dict):
+                    continue
+                url = result.get('url', '#')
+                if url == '#':
+                    continue
+                for text in split_passages(result.get('content', ''), self.passage_chars):
+                    passage_id = hashlib.sha1(f"{url}\n{text}".encode("utf-8")).hexdigest()[:16]
+                    if session is not None:
+                        session._touch(passage_id)
+                    if passage_id in self._passages:
+                        # Seen again: refresh its fetch time and recency
+                        self._passages[passage_id].fetched_at = fetched_at
+                        self._passages.move_to_end(passage_id)
+                        continue
+                    passage = Passage(url, result.get('title', ''), text, topic, fetched_at)
+                    self._passages[passage_id] = passage
+                    self._total_length += passage.length
+                    for term, count in passage.terms.items():
+                        self._postings.setdefault(term, {})[passage_id] = count
+                    metrics.increment("local_index.passages_added")
+            while len(self._passages) > self.max_passages:
+                self._evict()
+                metrics.increment("local_index.evicted")
+
+    def _evict(self):
+        passage_id, passage = self._passages.popitem(last=False)
+        self._total_length -= passage.length
+        for term in passage.terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(passage_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _idf(self, term: str, count: int) -> float:
+        frequency = len(self._postings.get(term, ()))
+        return math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+
+    def required_terms(self, query: str) -> Set[str]:
+        """
+        Query terms a local answer must cover: numbers (years, versions,
+        scores) and terms rare enough in the index to be what the question
+        is about. Terms the index has never seen are always required.
+        """
+        with self._lock:
+            count = len(self._passages)
+            return {
+                term for term in terms(query)
+                if any(char.isdigit() for char in term) or self._idf(term, count) >= self.required_idf
+            }
+
+    def search(self, query: str, limit: int = 5, topic: Optional[str] = None, max_age: Optional[float] = None, session: Optional[IndexSession] = None) -> List[Tuple[float, Passage]]:
+        """
+        BM25-ranked passages for ``query``, optionally restricted by topic,
+        age and to the passages ``session`` fetched.
+        """
+        query_terms = set(terms(query))
+        now = time.time()
+        with self._lock:
+            count = len(self._passages)
+            if not count or not query_terms:
+                return []
+            average_length = self._total_length / count
+            scores: Counter = Counter()
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = self._idf(term, count)
+                for passage_id, frequency in postings.items():
+                    length = self._passages[passage_id].length
+                    scores[passage_id] += idf * frequency * (self.K1 + 1) / (
+                        frequency + self.K1 * (1 - self.B + self.B * length / average_length)
+                    )
+
+            ranked = []
+            for passage_id, score in scores.most_common():
+                if session is not None and passage_id not in session.passage_ids:
+                    continue
+                passage = self._passages[passage_id]
+                if topic is not None and passage.topic != topic:
+                    continue
+                if max_age is not None and now - passage.fetched_at > max_age:
+                    continue
+                ranked.append((score, passage))
+                if len(ranked) >= limit:
+                    break
+            return ranked
+
+    @staticmethod
+    def resolve_reference(query: str, recent_results: List[Dict]) -> Optional[Dict]:
+        """
+        The result in ``recent_results`` that a query refers to by position
+        ("source 2", "that second link"), if it names one and asks nothing
+        the result doesn't talk about.
+        """
+        match = SOURCE_REFERENCE.search(query)
+        if not match:
+            return None
+        position = next(group for group in match.groups() if group).lower()
+        position = ORDINALS.get(position) or int(re.sub(r"\D", "", position) or 0)
+        if not 1 <= position <= len(recent_results) or not isinstance(recent_results[position - 1], dict):
+            return None
+
+        referenced = recent_results[position - 1]
+        rest = set(terms(SOURCE_REFERENCE.sub(" ", query))) - REFERENCE_WORDS
+        if rest and not rest.intersection(terms(f"{referenced.get('title', '')} {referenced.get('content', '')}")):
+            metrics.increment("local_index.miss.reference")
+            return None
+        return referenced
+
+    def lookup(self, query: str, topic: str = "general", max_results: int = 3, session: Optional[IndexSession] = None, references: bool = True) -> Optional[List[Dict]]:
+        """
+        Results for ``query`` built from indexed passages, or None when local
+        coverage or freshness is insufficient and the web should be searched.
+        With ``references``, "source N" style follow-ups resolve against the
+        results ``session`` was last shown.
+        """
+        if self._unavailable(session):
+            return None
+        max_age = self.news_max_age if topic == "news" else self.max_age
+        if references and session is not None and session.recent_results:
+            referenced = self.resolve_reference(query, session.recent_results)
+            if referenced is not None:
+                metrics.increment("local_index.hit.reference")
+                return [referenced]
+
+        hits = self.search(
+            query,
+            limit=max_results * 3,
+            topic=topic,
+            max_age=max_age,
+            session=session if self.scope == "session" else None
+        )
+        if not hits or hits[0][0] < self.min_score:
+            metrics.increment("local_index.miss")
+            return None
+
+        query_terms = set(terms(query))
+        covered = set()
+        for _, passage in hits:
+            covered.update(query_terms.intersection(passage.terms))
+        # "Who won the 2022 World Cup?" must not be answered by a page about
+        # 2018 just because most of its other terms match
+        if not self.required_terms(query) <= covered:
+            metrics.increment("local_index.miss.required")
+            return None
+        if len(covered) / len(query_terms) < self.min_coverage:
+            metrics.increment("local_index.miss.coverage")
+            return None
+
+        # Group passages back into one result per URL, best first
+        results: "OrderedDict[str, Dict]" = OrderedDict()
+        for _, passage in hits:
+            if passage.url not in results:
+                if len(results) >= max_results:
+                    continue
+                results[passage.url] = {'title': passage.title, 'url': passage.url, 'content': passage.text}
+            elif passage.text not in results[passage.url]['content']:
+                results[passage.url]['content'] += "\n" + passage.text
+        metrics.increment("local_index.hit")
+        return list(results.values())
+
+    def clear(self):
+        with self._lock:
+            self._passages.clear()
+            self._postings.clear()
+            self._total_length = 0
+
+
+# Shared by every GroqClient in the process, so each passage is held once;
+# sessions scope what a lookup can see
+local_index = LocalIndex.from_env()
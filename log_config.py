@@ -0,0 +1,150 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+from metrics import metrics
+from utils import TokenBucket
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+def record_fields(record: logging.LogRecord) -> Dict:
+    """Structured fields passed with ``extra=``, e.g. ``extra={"event": "search.results", "count": 3}``."""
+    return {key: value for key, value in vars(record).items() if key not in _RESERVED}
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text lines with structured fields appended as ``key=value``."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Sample records below WARNING and rate limit records below ERROR, so
+    errors always pass. Records are keyed by their ``event`` field, or by
+    logger and level when they have none. ``sample_rates`` maps event names
+    to the fraction of records kept; every key is also limited to ``rate``
+    records per second.
+    """
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None, rate: float = 50.0, burst: float = 100.0):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        event = getattr(record, "event", None)
+        if record.levelno < logging.WARNING and event is not None and random.random() >= self.sample_rates.get(event, 1.0):
+            metrics.increment("logging.sampled_out")
+            return False
+        if self.rate <= 0:
+            return True
+
+        key = event or f"{record.name}:{record.levelno}"
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.setdefault(key, TokenBucket(self.rate, self.burst))
+        if not bucket.try_acquire():
+            metrics.increment("logging.rate_limited")
+            return False
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.increment("logging.dropped")
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse ``"search.request=0.1,search.results=0.5"`` into a dict."""
+    rates = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        event, rate = item.split("=", 1)
+        try:
+            rates[event.strip()] = float(rate)
+        except ValueError:
+            continue
+    return rates
+
+
+def configure_logging(level: Optional[str] = None) -> QueueListener:
+    """
+    Route all logging through a bounded queue drained by a background
+    thread, so request threads never block on log I/O. Safe to call from
+    every entry point and on every Streamlit rerun; only the first call
+    configures anything.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter())
+
+        log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        handler = NonBlockingQueueHandler(log_queue)
+        handler.addFilter(SamplingFilter(
+            parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", "")),
+            rate=float(os.getenv("LOG_RATE_LIMIT", "50")),
+            burst=float(os.getenv("LOG_RATE_BURST", "100"))
+        ))
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
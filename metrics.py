@@ -0,0 +1,81 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+
+class Metrics:
+    """
+    Thread-safe, in-process metrics registry.
+
+    Counters only go up, gauges hold the latest value and observations keep
+    a bounded window of recent samples for percentile queries.
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.window = window
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.observations = defaultdict(lambda: deque(maxlen=self.window))
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self.observations[name].append(value)
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    def sample_count(self, name: str) -> int:
+        with self._lock:
+            return len(self.observations.get(name, ()))
+
+    def percentile(self, name: str, pct: float) -> Optional[float]:
+        """Return the ``pct`` percentile (0-100) of recent samples, or None."""
+        with self._lock:
+            samples = sorted(self.observations.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(pct / 100.0 * len(samples))) - 1))
+        return samples[index]
+
+    def snapshot(self) -> Dict:
+        """Return a JSON-serialisable view of all metrics."""
+        with self._lock:
+            observations = {name: sorted(values) for name, values in self.observations.items()}
+            snapshot = {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+        summaries = {}
+        for name, samples in observations.items():
+            if not samples:
+                continue
+            summaries[name] = {
+                "count": len(samples),
+                "mean": sum(samples) / len(samples),
+                "p50": samples[len(samples) // 2],
+                "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "max": samples[-1],
+            }
+        snapshot["observations"] = summaries
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.observations.clear()
+
+
+# Process-wide registry shared by the clients and servers
+metrics = Metrics()
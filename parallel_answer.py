@@ -0,0 +1,193 @@
+import os
+import time
+import threading
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from cancellation import CancellationToken, GenerationCancelled
+from search_providers import is_good_result_set
+from local_index import IndexSession
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundStream:
+    """
+    Consume a ``stream_response`` event generator in a daemon thread and
+    accumulate what it has produced so far, for another thread to poll.
+    """
+
+    def __init__(self, name: str, events: Iterator[Tuple[str, object]], on_event: Optional[Callable[["BackgroundStream", str, object], None]] = None):
+        self.name = name
+        self.events = events
+        self.on_event = on_event
+        self.reasoning = ""
+        self.answer = ""
+        self.search_results: Optional[List[Dict]] = None
+        self.response: Optional[str] = None
+        self.error: Optional[str] = None
+        self.cancelled = False
+        self.done = False
+        self.first_token_seconds: Optional[float] = None
+        self._started = 0.0
+        self._lock = threading.Lock()
+        self.worker = threading.Thread(target=self._consume, name=f"answer-{name}", daemon=True)
+
+    def start(self) -> "BackgroundStream":
+        self._started = time.monotonic()
+        self.worker.start()
+        return self
+
+    def _consume(self):
+        try:
+            for event, data in self.events:
+                with self._lock:
+                    if event == "search_results":
+                        self.search_results = data
+                    elif event == "reasoning":
+                        self.reasoning += data
+                    elif event == "answer":
+                        self.answer += data
+                    elif event == "done":
+                        self.response = data
+                    if event in ("reasoning", "answer") and self.first_token_seconds is None:
+                        self.first_token_seconds = time.monotonic() - self._started
+                        metrics.observe(f"parallel.{self.name}.first_token_seconds", self.first_token_seconds)
+                if self.on_event:
+                    self.on_event(self, event, data)
+        except GenerationCancelled as e:
+            logger.info(f"{self.name} answer stopped: {str(e)}")
+            with self._lock:
+                self.cancelled = True
+        except Exception as e:
+            logger.error(f"{self.name} answer failed: {str(e)}")
+            with self._lock:
+                self.error = str(e)
+        finally:
+            close = getattr(self.events, "close", None)
+            if close:
+                close()
+            with self._lock:
+                self.done = True
+            if self.on_event:
+                self.on_event(self, "finished", None)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "reasoning": self.reasoning,
+                "answer": self.answer,
+                "search_results": self.search_results,
+                "response": self.response,
+                "error": self.error,
+                "cancelled": self.cancelled,
+                "done": self.done,
+            }
+
+
+class ParallelAnswer:
+    """
+    Generate a plain and a search-grounded answer to the same conversation
+    concurrently, each in a background thread.
+
+    The plain answer usually arrives first and can be shown right away; the
+    grounded answer replaces it once it completes, at which point the plain
+    generation is cancelled if still running. If the search step fails or
+    finds nothing, the grounded generation stops and the plain answer is
+    final. Callers poll with ``poll``; when nobody has polled for
+    ``abandon_after`` seconds (the session went away) both are cancelled.
+    """
+
+    def __init__(self, groq_client, messages: List[Dict], tier: Optional[str] = None, abandon_after: Optional[float] = None, index_session: Optional[IndexSession] = None):
+        self.abandon_after = abandon_after if abandon_after is not None else float(os.getenv("PARALLEL_ABANDON_SECONDS", "30"))
+        self.last_polled = time.monotonic()
+
+        # Cancelling ``token`` stops both generations; each also has its own
+        # token so one can be stopped without the other
+        self.token = CancellationToken()
+        self.plain_token = CancellationToken()
+        self.grounded_token = CancellationToken()
+        self.token.on_cancel(lambda: self.plain_token.cancel(self.token.reason))
+        self.token.on_cancel(lambda: self.grounded_token.cancel(self.token.reason))
+
+        self._outcome_recorded = False
+        self._lock = threading.Lock()
+        self.plain = BackgroundStream(
+            "plain",
+            groq_client.stream_response(messages, search=False, tier=tier, cancel_token=self.plain_token),
+            self._on_event
+        )
+        self.grounded = BackgroundStream(
+            "grounded",
+            groq_client.stream_response(
+                messages,
+                search=True,
+                tier=tier,
+                cancel_token=self.grounded_token,
+                search_fallback=False,
+                index_session=index_session
+            ),
+            self._on_event
+        )
+
+    def start(self) -> "ParallelAnswer":
+        metrics.increment("parallel.answers")
+        self.plain.start()
+        self.grounded.start()
+        return self
+
+    def cancel(self, reason: str = "cancelled"):
+        self.token.cancel(reason)
+
+    def _on_event(self, stream: BackgroundStream, event: str, data):
+        if time.monotonic() - self.last_polled > self.abandon_after:
+            self.token.cancel("abandoned")
+
+        if stream is self.grounded:
+            if event == "search_results" and not is_good_result_set(data):
+                # Grounding on nothing would only repeat the plain answer
+                self.grounded_token.cancel("no_results")
+            elif event == "done" and not self.plain.done:
+                self.plain_token.cancel("superseded")
+
+        if event == "finished":
+            self._record_outcome()
+
+    def _record_outcome(self):
+        if not self.finished:
+            return
+        with self._lock:
+            if self._outcome_recorded:
+                return
+            self._outcome_recorded = True
+        if self.grounded.response is not None:
+            metrics.increment("parallel.outcome.grounded")
+        elif self.plain.response is not None:
+            metrics.increment("parallel.outcome.plain")
+        else:
+            metrics.increment("parallel.outcome.failed")
+
+    @property
+    def finished(self) -> bool:
+        """True once the grounded answer is in, or both generations ended."""
+        return self.grounded.done and (self.grounded.response is not None or self.plain.done)
+
+    def poll(self) -> Dict:
+        """Current state of both generations; also keeps them from being abandoned."""
+        self.last_polled = time.monotonic()
+        return {
+            "plain": self.plain.snapshot(),
+            "grounded": self.grounded.snapshot(),
+            "finished": self.finished,
+        }
+
+    def result(self) -> Tuple[Optional[str], Optional[List[Dict]]]:
+        """The final raw response and the search results it is grounded on."""
+        if self.grounded.response is not None:
+            return self.grounded.response, self.grounded.search_results
+        if self.plain.response is not None:
+            return self.plain.response, None
+        return None, None
+
+    def error(self) -> Optional[str]:
+        return self.plain.error or self.grounded.error
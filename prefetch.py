@@ -0,0 +1,164 @@
+import os
+import re
+import queue
+import threading
+import logging
+from collections import Counter
+from typing import Dict, List, Optional
+from metrics import metrics
+from utils import normalize_query, TokenBucket
+from search_manager import SearchManager, searches_in_flight
+
+logger = logging.getLogger(__name__)
+
+ENTITY_PATTERN = re.compile(r"\b[A-Z][\w&'.-]*(?:\s+(?:of|de|da|del|di|la|le|van|von|der|the|and|&)?\s*[A-Z][\w&'.-]*)*")
+STOP_WORDS = {
+    "a", "an", "and", "the", "this", "that", "these", "those", "what", "why", "how", "when", "where", "who",
+    "which", "is", "are", "was", "were", "in", "on", "of", "for", "to", "with", "from", "by", "at", "as",
+    "new", "news", "latest", "top", "best", "guide", "home", "page", "video", "update", "updates", "live",
+    "i", "it", "its", "you", "your", "we", "our", "my", "he", "she", "they", "their", "here", "there",
+}
+# Publishers and sites that show up in titles but are never what the user asks about next
+SITE_NAMES = {
+    "wikipedia", "bbc", "cnn", "reuters", "youtube", "reddit", "twitter", "facebook", "instagram", "linkedin",
+    "medium", "quora", "imdb", "espn", "forbes", "bloomberg", "yahoo", "msn", "google", "github", "britannica",
+    "ap", "ap news", "associated press", "fox news", "nbc news", "cbs news", "abc news", "the guardian",
+    "the new york times", "nytimes", "the washington post", "stack overflow", "investopedia",
+}
+DOMAIN_PATTERN = re.compile(r"\.(?:com|org|net|gov|edu|io|co|uk)\b", re.IGNORECASE)
+# " - Wikipedia", " | BBC Sport": the site name trailing a title
+TITLE_SUFFIX = re.compile(r"\s+[-|\u2013\u2014]\s+[^-|\u2013\u2014]*$")
+
+
+def derive_follow_up_queries(query: str, search_results: List[Dict], messages: List[Dict], limit: int = 3) -> List[str]:
+    """
+    Guess searches a user is likely to ask next.
+
+    Candidates are entities named in result titles that the current query
+    doesn't already cover. Site names are ignored, and so is a title's
+    capitalised first word unless it starts a multi-word entity. Entities
+    that recur across results or that the conversation has mentioned before
+    rank higher.
+    """
+    query_text = normalize_query(query)
+    conversation = " ".join(
+        message.get("content", "") for message in messages[:-1] if message.get("role") == "user"
+    ).lower()
+
+    scores = Counter()
+    display = {}
+    for result in search_results:
+        if not isinstance(result, dict) or not result.get("url"):
+            continue
+        seen_in_result = set()
+        title = TITLE_SUFFIX.sub("", result.get("title", "").strip())
+        for match in ENTITY_PATTERN.finditer(title):
+            entity = match.group().strip(" .-'&")
+            key = normalize_query(entity)
+            if len(key) < 3 or key in STOP_WORDS or key in query_text or key in seen_in_result:
+                continue
+            if match.start() == 0 and " " not in entity:
+                continue
+            if key in SITE_NAMES or key.split()[0] in SITE_NAMES or DOMAIN_PATTERN.search(entity):
+                continue
+            seen_in_result.add(key)
+            display.setdefault(key, entity)
+            scores[key] += 2 if key in conversation else 1
+
+    return [display[key] for key, _ in scores.most_common(limit)]
+
+
+class SearchPrefetcher:
+    """
+    Warm the shared search cache with likely follow-up searches.
+
+    Work runs on a small background pool fed by a bounded queue, so it never
+    blocks the request that scheduled it. Prefetches are rate limited, and
+    are skipped whenever interactive searches are already busy upstream.
+    """
+
+    def __init__(self, enabled: bool = False, max_queries: int = 3, rate: float = 0.5, burst: float = 3.0, max_searches_in_flight: int = 4, queue_size: int = 16, workers: int = 1):
+        self.enabled = enabled
+        self.max_queries = max_queries
+        self.max_searches_in_flight = max_searches_in_flight
+        self.limiter = TokenBucket(rate, burst)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.workers = workers
+        self._search_manager = None
+        self._started = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SearchPrefetcher":
+        return cls(
+            enabled=os.getenv("PREFETCH_ENABLED", "0").strip().lower() in ("1", "true", "yes", "on"),
+            max_queries=int(os.getenv("PREFETCH_MAX_QUERIES", "3")),
+            rate=float(os.getenv("PREFETCH_RATE", "0.5")),
+            burst=float(os.getenv("PREFETCH_BURST", "3")),
+            max_searches_in_flight=int(os.getenv("PREFETCH_MAX_SEARCHES_IN_FLIGHT", "4")),
+            queue_size=int(os.getenv("PREFETCH_QUEUE_SIZE", "16"))
+        )
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            # A dedicated SearchManager keeps prefetches out of the sessions'
+            # own rate-limit windows
+            self._search_manager = SearchManager()
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f"prefetch-{i}", daemon=True).start()
+            self._started = True
+
+    def schedule(self, query: str, search_results: List[Dict], messages: List[Dict], topic: str = "general", days: Optional[int] = None, max_results: int = 3):
+        """Queue follow-up searches derived from a completed search; never blocks."""
+        if not self.enabled:
+            return
+        try:
+            candidates = derive_follow_up_queries(query, search_results, messages, self.max_queries)
+            if not candidates:
+                return
+            self._ensure_started()
+            for candidate in candidates:
+                self.queue.put_nowait((candidate, max_results, topic, days))
+                metrics.increment("prefetch.scheduled")
+        except queue.Full:
+            metrics.increment("prefetch.dropped")
+        except Exception as e:
+            logger.warning(f"Could not schedule prefetch: {str(e)}")
+
+    def _run(self):
+        while True:
+            query, max_results, topic, days = self.queue.get()
+            try:
+                if searches_in_flight() >= self.max_searches_in_flight:
+                    metrics.increment("prefetch.skipped_busy")
+                    continue
+                if not self.limiter.try_acquire():
+                    metrics.increment("prefetch.skipped_rate_limited")
+                    continue
+                if self._search_manager.warm(query, max_results=max_results, topic=topic, days=days):
+                    metrics.increment("prefetch.issued")
+                else:
+                    metrics.increment("prefetch.skipped_cached")
+            except Exception as e:
+                logger.warning(f"Prefetch failed for {query!r}: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> Dict:
+        """Prefetch effectiveness: issued searches, hits and hit rate."""
+        issued = metrics.count("prefetch.issued")
+        hits = metrics.count("prefetch.hit")
+        return {
+            "enabled": self.enabled,
+            "scheduled": metrics.count("prefetch.scheduled"),
+            "issued": issued,
+            "hits": hits,
+            "wasted": metrics.count("prefetch.wasted"),
+            "hit_rate": hits / issued if issued else 0.0,
+        }
+
+
+# Process-wide prefetcher shared by every GroqClient
+prefetcher = SearchPrefetcher.from_env()
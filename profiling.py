@@ -0,0 +1,249 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import inspect
+import logging
+import functools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Generator, Iterator, Optional
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    """
+    Statistical profile of one request.
+
+    The request's thread is sampled only while the request is actually
+    running in it, so for a generator the time its consumer spends between
+    items (rendering, network writes) counts as ``suspended`` rather than
+    as work done by the request. CPU time is the thread's CPU time while
+    running; the rest of the running wall time was spent waiting on I/O or
+    locks.
+    """
+
+    def __init__(self, name: str, tags: Optional[Dict] = None):
+        self.name = name
+        self.tags = tags or {}
+        self.id = uuid.uuid4().hex[:8]
+        self.started = time.monotonic()
+        self.thread_id: Optional[int] = None
+        self.cpu_seconds = 0.0
+        self.running_seconds = 0.0
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.leaves: Counter = Counter()
+        self._resumed = 0.0
+        self._resumed_cpu = 0.0
+
+    def resume(self):
+        self._resumed = time.monotonic()
+        self._resumed_cpu = time.thread_time()
+        self.thread_id = threading.get_ident()
+
+    def suspend(self):
+        self.thread_id = None
+        self.cpu_seconds += time.thread_time() - self._resumed_cpu
+        self.running_seconds += time.monotonic() - self._resumed
+
+    def sample(self, frame, max_depth: int = 64):
+        stack = []
+        while frame is not None and len(stack) < max_depth:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if not stack:
+            return
+        self.samples += 1
+        self.leaves[stack[0]] += 1
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def summary(self, interval: float) -> Dict:
+        wall = time.monotonic() - self.started
+        return {
+            "name": self.name,
+            "id": self.id,
+            "tags": self.tags,
+            "wall_seconds": wall,
+            "cpu_seconds": self.cpu_seconds,
+            "wait_seconds": max(0.0, self.running_seconds - self.cpu_seconds),
+            "suspended_seconds": max(0.0, wall - self.running_seconds),
+            "sample_interval": interval,
+            "samples": self.samples,
+            "top_functions": [
+                {"function": function, "share": count / self.samples}
+                for function, count in self.leaves.most_common(25)
+            ] if self.samples else [],
+            "stacks": dict(self.stacks.most_common()),
+        }
+
+
+class RequestProfiler:
+    """
+    Opt-in per-request profiler.
+
+    Profiles every request when ``enabled``, otherwise the ``sample_rate``
+    fraction of them. Each profiled request is written to ``directory`` as a
+    JSON summary (wall/CPU/wait split and top functions) plus a ``.folded``
+    stack file for flamegraph tools. Nested profiled calls in the same
+    thread are part of the outermost request. When disabled, the only cost
+    is one attribute check per call.
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = 0.0, directory: str = "profiles", interval: float = 0.005):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.interval = interval
+        self.active = enabled or sample_rate > 0
+        self._profiles: Dict[str, RequestProfile] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls) -> "RequestProfiler":
+        return cls(
+            enabled=os.getenv("PROFILE_ENABLED", "0").lower() in ("1", "true", "yes"),
+            sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            directory=os.getenv("PROFILE_DIR", "profiles"),
+            interval=float(os.getenv("PROFILE_INTERVAL", "0.005"))
+        )
+
+    def start(self, name: str, **tags) -> Optional[RequestProfile]:
+        """Begin profiling a request in this thread, or return None if it isn't sampled."""
+        if not self.active or getattr(self._local, "profile", None) is not None:
+            return None
+        if not self.enabled and random.random() >= self.sample_rate:
+            return None
+
+        profile = RequestProfile(name, tags)
+        with self._lock:
+            self._profiles[profile.id] = profile
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+        return profile
+
+    def finish(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.pop(profile.id, None)
+        self._write(profile)
+
+    def _enter(self, profile: RequestProfile):
+        profile.resume()
+        self._local.profile = profile
+
+    def _exit(self, profile: RequestProfile):
+        self._local.profile = None
+        profile.suspend()
+
+    @contextmanager
+    def profile(self, name: str, **tags):
+        """Profile the enclosed block as one request, if sampled."""
+        profile = self.start(name, **tags)
+        if profile is None:
+            yield None
+            return
+        self._enter(profile)
+        try:
+            yield profile
+        finally:
+            self._exit(profile)
+            self.finish(profile)
+
+    def profile_stream(self, name: str, items: Iterator, **tags) -> Generator:
+        """Profile a generator over its whole lifetime, counting only the time spent producing items."""
+        profile = None
+        try:
+            while True:
+                if profile is None:
+                    profile = self.start(name, **tags)
+                    if profile is None:
+                        return (yield from items)
+                self._enter(profile)
+                try:
+                    item = next(items)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    self._exit(profile)
+                yield item
+        finally:
+            close = getattr(items, "close", None)
+            if close:
+                close()
+            if profile is not None:
+                self.finish(profile)
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                profiles = list(self._profiles.values())
+            if not profiles:
+                continue
+            frames = sys._current_frames()
+            for profile in profiles:
+                thread_id = profile.thread_id
+                if thread_id is not None and thread_id != own_id and thread_id in frames:
+                    profile.sample(frames[thread_id])
+            del frames
+
+    def _write(self, profile: RequestProfile):
+        summary = profile.summary(self.interval)
+        metrics.increment("profiling.captured")
+        metrics.observe("profiling.cpu_seconds", summary["cpu_seconds"])
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+            base = os.path.join(self.directory, f"{stamp}-{profile.name}-{profile.id}")
+            with open(base + ".json", "w") as output:
+                json.dump(summary, output, indent=2, default=str)
+            with open(base + ".folded", "w") as output:
+                output.writelines(f"{stack} {count}\n" for stack, count in profile.stacks.most_common())
+            logger.info(
+                "Profiled %s: wall %.3fs, cpu %.3fs, wait %.3fs -> %s.json",
+                profile.name, summary["wall_seconds"], summary["cpu_seconds"], summary["wait_seconds"], base
+            )
+        except OSError as e:
+            metrics.increment("profiling.write_failed")
+            logger.error(f"Failed to write profile for {profile.name}: {str(e)}")
+
+
+# Shared by every request handler in the process
+profiler = RequestProfiler.from_env()
+
+
+def profiled(name: str) -> Callable:
+    """
+    Decorator profiling each call of a function, or the full lifetime of
+    each generator a generator function returns, as one request.
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                # Stays a generator function so frameworks that check for
+                # one (Gradio) keep streaming
+                if not profiler.active:
+                    return (yield from func(*args, **kwargs))
+                return (yield from profiler.profile_stream(name, func(*args, **kwargs)))
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.active:
+                return func(*args, **kwargs)
+            with profiler.profile(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
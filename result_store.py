@@ -0,0 +1,146 @@
+import os
+import json
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+from metrics import metrics
+
+RESULT_FIELDS = ('title', 'url', 'content')
+
+
+class _StoredResult:
+    __slots__ = ("result", "size", "refs")
+
+    def __init__(self, result: Dict, size: int):
+        self.result = result
+        self.size = size
+        self.refs = 0
+
+
+class ResultStore:
+    """
+    Process-wide, content-addressed store for search results.
+
+    Identical results are kept once and referred to by a short content
+    hash. Holders take a reference per ID they keep; entries nobody
+    references stay in an LRU of ``max_unreferenced`` entries (so a result
+    that is fetched again is shared) before being evicted. Stored results
+    are shared between sessions and must be treated as read-only.
+    """
+
+    def __init__(self, max_unreferenced: int = 500):
+        self.max_unreferenced = max_unreferenced
+        self._entries: Dict[str, _StoredResult] = {}
+        self._unreferenced: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def result_id(result: Dict) -> str:
+        canonical = json.dumps({field: result.get(field, '') for field in RESULT_FIELDS}, sort_keys=True)
+        return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _size(result: Dict) -> int:
+        return sum(len(str(result.get(field, ''))) for field in RESULT_FIELDS)
+
+    def intern(self, results: Iterable[Dict]) -> List[str]:
+        """Store ``results`` (deduplicated) and take one reference per returned ID."""
+        ids = []
+        with self._lock:
+            for result in results:
+                if not isinstance(result, dict):
+                    continue
+                result_id = self.result_id(result)
+                entry = self._entries.get(result_id)
+                if entry is None:
+                    stored = {field: result.get(field, '') for field in RESULT_FIELDS}
+                    entry = self._entries[result_id] = _StoredResult(stored, self._size(stored))
+                entry.refs += 1
+                self._unreferenced.pop(result_id, None)
+                ids.append(result_id)
+            self._update_gauges()
+        return ids
+
+    def resolve(self, ids: Iterable[str]) -> List[Dict]:
+        """Return the stored results for ``ids``, skipping any that were evicted."""
+        with self._lock:
+            return [self._entries[result_id].result for result_id in ids if result_id in self._entries]
+
+    def release(self, ids: Iterable[str]):
+        """Drop one reference per ID; unreferenced entries become evictable."""
+        with self._lock:
+            for result_id in ids:
+                entry = self._entries.get(result_id)
+                if entry is None or entry.refs == 0:
+                    continue
+                entry.refs -= 1
+                if entry.refs == 0:
+                    self._unreferenced[result_id] = None
+            while len(self._unreferenced) > self.max_unreferenced:
+                result_id, _ = self._unreferenced.popitem(last=False)
+                del self._entries[result_id]
+                metrics.increment("result_store.evicted")
+            self._update_gauges()
+
+    def size_of(self, ids: Iterable[str]) -> int:
+        with self._lock:
+            return sum(self._entries[result_id].size for result_id in set(ids) if result_id in self._entries)
+
+    def _update_gauges(self):
+        metrics.set_gauge("result_store.entries", len(self._entries))
+        metrics.set_gauge("result_store.unreferenced", len(self._unreferenced))
+
+    def stats(self) -> Dict:
+        """Process-wide memory usage: stored vs. logically referenced bytes."""
+        with self._lock:
+            stored_bytes = sum(entry.size for entry in self._entries.values())
+            referenced_bytes = sum(entry.size * entry.refs for entry in self._entries.values())
+            return {
+                "entries": len(self._entries),
+                "unreferenced_entries": len(self._unreferenced),
+                "references": sum(entry.refs for entry in self._entries.values()),
+                "stored_bytes": stored_bytes,
+                "referenced_bytes": referenced_bytes,
+                "dedup_ratio": referenced_bytes / stored_bytes if stored_bytes else 1.0,
+            }
+
+
+class SessionResults:
+    """
+    The result IDs one session holds. Every reference is released when the
+    session (and with it this object) is discarded.
+    """
+
+    def __init__(self, store: "ResultStore" = None):
+        self.store = store or result_store
+        self._ids: List[str] = []
+        weakref.finalize(self, self.store.release, self._ids)
+
+    def add(self, results: Iterable[Dict]) -> List[str]:
+        ids = self.store.intern(results)
+        self._ids.extend(ids)
+        return ids
+
+    def resolve(self, ids: Iterable[str]) -> List[Dict]:
+        return self.store.resolve(ids)
+
+    def release(self, ids: Iterable[str]):
+        ids = list(ids)
+        for result_id in ids:
+            if result_id in self._ids:
+                self._ids.remove(result_id)
+        self.store.release(ids)
+
+    def stats(self) -> Dict:
+        """Memory attributable to this session, before and after sharing."""
+        return {
+            "references": len(self._ids),
+            "unique_results": len(set(self._ids)),
+            "bytes": self.store.size_of(self._ids),
+        }
+
+
+# Shared by every session in the process
+result_store = ResultStore(max_unreferenced=int(os.getenv("RESULT_STORE_MAX_UNREFERENCED", "500")))
@@ -0,0 +1,139 @@
+import os
+import re
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+REASONING = "reasoning"
+
+GREETING_PATTERN = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks|thank you|thx|good (morning|afternoon|evening)|bye|goodbye|ok(ay)?|cool|great)\b[\s!.?]*$",
+    re.IGNORECASE
+)
+FACTUAL_PATTERN = re.compile(r"^\s*(what|who|when|where|which)\s+(is|are|was|were)\b", re.IGNORECASE)
+REASONING_PATTERN = re.compile(
+    r"\b(why|how (do|does|did|can|could|would|should)|explain|compare|analy[sz]e|evaluate|pros and cons|"
+    r"step[- ]by[- ]step|prove|derive|calculate|solve|plan|design|debug|trade-?offs?|implications?)\b",
+    re.IGNORECASE
+)
+
+
+@dataclass
+class ModelTier:
+    name: str
+    model: str
+    max_tokens: int
+    temperature: float
+    top_p: float = 0.95
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+class ModelRouter:
+    """
+    Route each request to a model tier using cheap local signals: message
+    length, question type, whether search is involved and conversation depth.
+    """
+
+    def __init__(self, tiers: Dict[str, ModelTier], enabled: bool = True, forced_tier: Optional[str] = None, threshold: int = 2):
+        self.tiers = tiers
+        self.enabled = enabled
+        self.forced_tier = forced_tier
+        self.threshold = threshold
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Build a router from GROQ_* tier variables."""
+        tiers = {
+            FAST: ModelTier(
+                name=FAST,
+                model=os.getenv("GROQ_FAST_MODEL", "llama-3.1-8b-instant"),
+                max_tokens=int(os.getenv("GROQ_FAST_MAX_TOKENS", "1024")),
+                temperature=float(os.getenv("GROQ_FAST_TEMPERATURE", "0.5"))
+            ),
+            REASONING: ModelTier(
+                name=REASONING,
+                model=os.getenv("GROQ_REASONING_MODEL", "deepseek-r1-distill-llama-70b"),
+                max_tokens=int(os.getenv("GROQ_REASONING_MAX_TOKENS", "2000")),
+                temperature=float(os.getenv("GROQ_REASONING_TEMPERATURE", "0.6"))
+            ),
+        }
+        forced_tier = os.getenv("GROQ_FORCE_TIER", "").strip() or None
+        if forced_tier and forced_tier not in tiers:
+            logger.warning(f"Ignoring unknown GROQ_FORCE_TIER: {forced_tier}")
+            forced_tier = None
+        return cls(
+            tiers,
+            enabled=_env_bool("GROQ_ROUTING_ENABLED", True),
+            forced_tier=forced_tier,
+            threshold=int(os.getenv("GROQ_ROUTING_THRESHOLD", "2"))
+        )
+
+    def score(self, messages: List[Dict], search: bool = False) -> int:
+        """Complexity score for the latest user message; higher needs a bigger model."""
+        query = messages[-1].get("content", "") if messages else ""
+        if GREETING_PATTERN.match(query):
+            return 0
+
+        words = len(query.split())
+        score = 0
+        if words > 40:
+            score += 2
+        elif words > 15:
+            score += 1
+        if REASONING_PATTERN.search(query):
+            score += 2
+        if "```" in query or "\n" in query.strip():
+            score += 1
+        if FACTUAL_PATTERN.match(query) and words <= 12:
+            score -= 1
+        if search:
+            # Synthesising several sources benefits from the larger model
+            score += 1
+        user_turns = sum(1 for message in messages if message.get("role") == "user")
+        if user_turns >= 4:
+            score += 1
+        return score
+
+    def classify(self, messages: List[Dict], search: bool = False) -> str:
+        return REASONING if self.score(messages, search) >= self.threshold else FAST
+
+    def utility_tier(self) -> ModelTier:
+        """
+        Tier for small internal calls such as topic classification: the
+        forced tier if set, otherwise the fast tier unless routing is off.
+        Not counted as a request.
+        """
+        if self.forced_tier:
+            return self.tiers[self.forced_tier]
+        return self.tiers[FAST] if self.enabled else self.tiers[REASONING]
+
+    def route(self, messages: List[Dict], search: bool = False, tier: Optional[str] = None) -> ModelTier:
+        """
+        Pick the tier for a request. An explicit ``tier`` wins, then
+        GROQ_FORCE_TIER; with routing disabled everything uses the reasoning tier.
+        """
+        if tier is not None and tier not in self.tiers:
+            raise ValueError(f"Unknown model tier: {tier}")
+
+        if tier is not None:
+            name = tier
+            metrics.increment("llm.route.override")
+        elif self.forced_tier:
+            name = self.forced_tier
+        elif not self.enabled:
+            name = REASONING
+        else:
+            name = self.classify(messages, search)
+
+        metrics.increment(f"llm.tier.{name}.requests")
+        return self.tiers[name]
@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+from metrics import metrics
+
+
+class _Entry:
+    def __init__(self, results: List[Dict], expires_at: float, prefetched: bool):
+        self.results = results
+        self.expires_at = expires_at
+        self.prefetched = prefetched
+        self.used = False
+
+
+class SearchCache:
+    """
+    Process-wide LRU cache of search results with per-topic TTLs.
+
+    Entries written by the prefetcher are tracked so the first lookup that
+    uses one counts as a prefetch hit, and one that expires or is evicted
+    unused counts as wasted.
+    """
+
+    def __init__(self, ttl: float = 300.0, news_ttl: float = 60.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.news_ttl = news_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SearchCache":
+        return cls(
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "300")),
+            news_ttl=float(os.getenv("SEARCH_CACHE_NEWS_TTL", "60")),
+            max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key)
+        if entry.prefetched and not entry.used:
+            metrics.increment("prefetch.wasted")
+
+    def get(self, key: Hashable) -> Optional[List[Dict]]:
+        """Return fresh results for ``key``, recording hit/miss accounting."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                metrics.increment("search_cache.miss")
+                return None
+
+            self._entries.move_to_end(key)
+            metrics.increment("search_cache.hit")
+            if entry.prefetched and not entry.used:
+                metrics.increment("prefetch.hit")
+            entry.used = True
+            return entry.results
+
+    def contains(self, key: Hashable) -> bool:
+        """Check for a fresh entry without touching accounting or LRU order."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.expires_at > time.monotonic()
+
+    def put(self, key: Hashable, results: List[Dict], topic: str = "general", prefetched: bool = False):
+        if not self.enabled:
+            return
+        ttl = self.news_ttl if topic == "news" else self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(results, time.monotonic() + ttl, prefetched)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+            metrics.set_gauge("search_cache.entries", len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            metrics.set_gauge("search_cache.entries", 0)
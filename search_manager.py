@@ -1,95 +1,147 @@
-import os
+import re
 import time
 import logging
-from typing import List, Dict, Optional
-from tavily import TavilyClient
-from utils import format_message
+from typing import List, Dict, Optional, Tuple
+from search_providers import SearchProvider, TavilyProvider, pool_from_env
+from utils import format_message, normalize_query
+from singleflight import SingleFlight
+from search_cache import SearchCache
+from cancellation import CancellationToken, raise_if_cancelled
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared by every SearchManager in the process
+_search_flight = SingleFlight("search")
+_search_cache = SearchCache.from_env()
+
+FOLLOW_UP_PREFIX = re.compile(
+    r"^(tell me (more )?about|more (info|information|details)? ?(on|about)|what about|how about|and|what is|what are|who is|who are)\s+",
+    re.IGNORECASE
+)
+
+
+def searches_in_flight() -> int:
+    """Distinct upstream searches currently running in this process."""
+    return _search_flight.in_flight()
+
+
+def search_key(query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None) -> tuple:
+    """
+    Key identifying equivalent searches for caching and coalescing.
+
+    Conversational follow-up phrasing is stripped so "tell me more about X"
+    can reuse results fetched for "X".
+    """
+    normalized = normalize_query(query)
+    stripped = FOLLOW_UP_PREFIX.sub("", normalized).strip()
+    return (stripped or normalized, max_results, topic, days if topic == "news" else None)
+
+
 class SearchManager:
-    def __init__(self):
+    def __init__(self, providers: Optional[List[SearchProvider]] = None):
+        """
+        Args:
+            providers: Search backends to use; defaults to those named in
+                SEARCH_PROVIDERS. Pass stand-in providers to run offline.
+        """
         try:
-            self.client = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
+            self.pool = pool_from_env(providers)
+            # Kept for Tavily-only features such as get_search_context
+            tavily = next((p for p in self.pool.providers if isinstance(p, TavilyProvider)), None)
+            self.client = tavily.client if tavily else None
             self.last_request_time = 0
             self.min_request_interval = 1.0  # Tavily has better rate limits
-            logger.info("SearchManager initialized with Tavily API")
+            logger.info(f"SearchManager initialized with providers: {[p.name for p in self.pool.providers]} ({self.pool.mode} mode)")
         except Exception as e:
-            logger.error(f"Failed to initialize Tavily client: {str(e)}")
+            logger.error(f"Failed to initialize search providers: {str(e)}")
             raise
 
-    def search(self, query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None) -> List[Dict]:
+    def search(self, query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None, cancel_token: Optional[CancellationToken] = None) -> List[Dict]:
         """
-        Perform a web search using Tavily API with proper error handling.
+        Perform a web search across the configured providers with proper error handling.
 
         Args:
             query: The search query string
             max_results: Maximum number of results to return
             topic: Search topic type ("general" or "news")
             days: Number of days back to search (only for news topic)
+            cancel_token: Raises GenerationCancelled instead of searching, or
+                instead of returning results, once cancelled
         """
         if not query.strip():
             logger.warning("Empty query provided")
             return []
 
+        raise_if_cancelled(cancel_token)
+        key = search_key(query, max_results, topic, days)
+        cached = _search_cache.get(key)
+        if cached is not None:
+            return list(cached)
+
+        # Identical concurrent searches share one upstream call. The shared
+        # call runs without any one caller's token; each caller checks its own.
+        results = _search_flight.do(
+            key,
+            lambda: self._fetch(key, query, max_results, topic, days),
+            cancel_token=cancel_token
+        )
+        raise_if_cancelled(cancel_token)
+        return list(results)
+
+    def warm(self, query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None) -> bool:
+        """
+        Fetch results into the shared cache ahead of need.
+
+        Returns False without searching if fresh results are already cached.
+        """
+        key = search_key(query, max_results, topic, days)
+        if _search_cache.contains(key):
+            return False
+        _search_flight.do(key, lambda: self._fetch(key, query, max_results, topic, days, prefetched=True))
+        return True
+
+    def _fetch(self, key: tuple, query: str, max_results: int, topic: str, days: Optional[int], prefetched: bool = False) -> List[Dict]:
+        results, ok = self._search(query, max_results, topic, days)
+        if ok:
+            _search_cache.put(key, results, topic=topic, prefetched=prefetched)
+        return results
+
+    def _search(self, query: str, max_results: int, topic: str, days: Optional[int]) -> Tuple[List[Dict], bool]:
+        """
+        Run one provider search, rate limited per SearchManager. Returns the
+        results and whether they are real (cacheable) results. Runs to
+        completion: it may be shared by several callers through single-flight,
+        so no one caller's cancellation interrupts it.
+        """
         try:
             # Implement rate limiting
             current_time = time.time()
             time_since_last_request = current_time - self.last_request_time
             if time_since_last_request < self.min_request_interval:
                 wait_time = self.min_request_interval - time_since_last_request
-                logger.info(f"Rate limiting: waiting {wait_time:.2f} seconds")
+                logger.debug("Rate limiting: waiting %.2f seconds", wait_time)
                 time.sleep(wait_time)
 
-            # Prepare search parameters
-            search_params = {
-                'query': query,
-                'max_results': max_results,
-                'topic': topic
-            }
-
-            # Only add days parameter for news searches
-            if topic == "news" and days is not None:
-                search_params['days'] = days
-
-            logger.info(f"Performing Tavily search with params: {search_params}")
-            response = self.client.search(**search_params)
+            results = self.pool.search(query, max_results=max_results, topic=topic, days=days)
             self.last_request_time = time.time()
 
-            if not response or not response.get('results'):
-                return [{
-                    'title': 'No Results',
-                    'link': '#',
-                    'snippet': 'No search results found. Please try with different search terms.'
-                }]
-
-            # Format results to match our expected structure
-            formatted_results = []
-            for result in response['results'][:max_results]:
-                formatted_results.append({
-                    'title': result.get('title', '').strip(),
-                    'url': result.get('url', '#').strip(),
-                    'content': result.get('content', '').strip()
-                })
-
-            logger.info(f"Successfully retrieved {len(formatted_results)} results")
-            return formatted_results
+            logger.info("Search returned %d results", len(results), extra={"event": "search.results", "count": len(results)})
+            return results, True
 
         except Exception as e:
-            error_msg = f"Search error: {str(e)}"
-            logger.error(error_msg)
-            return [{
-                'title': 'Search Error',
-                'link': '#',
-                'snippet': 'An error occurred while performing the search. Please try again later.'
-            }]
+            # No placeholder results: callers treat an empty list as "no
+            # search context" rather than feeding an error to the model
+            self.last_request_time = time.time()
+            logger.error(f"Search error: {str(e)}")
+            return [], False
 
     def get_search_context(self, query: str) -> str:
         """
         Get a summarized context for RAG applications.
         """
+        if self.client is None:
+            return "Unable to generate search context at this time."
         try:
             context = self.client.get_search_context(query=query)
             return context
@@ -0,0 +1,321 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SearchProviderError(Exception):
+    """Raised when a provider, or every provider, fails to return results."""
+
+
+class SearchProvider:
+    """
+    Interface for web search backends.
+
+    ``search`` returns results normalised to ``{'title', 'url', 'content'}``
+    and raises on failure instead of returning placeholder results.
+    """
+
+    name = "provider"
+
+    def search(self, query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None) -> List[Dict]:
+        raise NotImplementedError
+
+    @staticmethod
+    def normalize(title: Optional[str], url: Optional[str], content: Optional[str]) -> Dict:
+        return {
+            'title': (title or '').strip(),
+            'url': (url or '#').strip(),
+            'content': (content or '').strip()
+        }
+
+
+class TavilyProvider(SearchProvider):
+    name = "tavily"
+
+    def __init__(self, api_key: Optional[str] = None):
+        from tavily import TavilyClient
+        self.client = TavilyClient(api_key=api_key or os.environ["TAVILY_API_KEY"])
+
+    def search(self, query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None) -> List[Dict]:
+        # Prepare search parameters
+        search_params = {
+            'query': query,
+            'max_results': max_results,
+            'topic': topic
+        }
+
+        # Only add days parameter for news searches
+        if topic == "news" and days is not None:
+            search_params['days'] = days
+
+        logger.debug("Performing Tavily search with params: %s", search_params)
+        response = self.client.search(**search_params)
+        return [
+            self.normalize(result.get('title'), result.get('url'), result.get('content'))
+            for result in (response or {}).get('results', [])[:max_results]
+        ]
+
+
+class DuckDuckGoProvider(SearchProvider):
+    name = "duckduckgo"
+
+    def __init__(self):
+        # Fails with ImportError when duckduckgo-search isn't installed
+        from duckduckgo_search import DDGS
+        self._ddgs_class = DDGS
+
+    @staticmethod
+    def timelimit(days: Optional[int]) -> Optional[str]:
+        if days is None:
+            return None
+        if days <= 1:
+            return "d"
+        if days <= 7:
+            return "w"
+        return "m"
+
+    def search(self, query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None) -> List[Dict]:
+        logger.debug("Performing DuckDuckGo %s search for query: %s", topic, query)
+        with self._ddgs_class() as ddgs:
+            if topic == "news":
+                results = ddgs.news(query, timelimit=self.timelimit(days), max_results=max_results)
+                return [
+                    self.normalize(result.get('title'), result.get('url'), result.get('body'))
+                    for result in list(results or [])[:max_results]
+                ]
+            results = ddgs.text(query, max_results=max_results)
+            return [
+                self.normalize(result.get('title'), result.get('href'), result.get('body'))
+                for result in list(results or [])[:max_results]
+            ]
+
+
+class ProviderHealth:
+    """
+    Exponentially weighted success rate and latency for one provider, plus
+    a short cooldown after repeated consecutive failures. Latency is None
+    until the provider has been called.
+    """
+
+    def __init__(self, alpha: float = 0.2, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.success_rate = 1.0
+        self.latency: Optional[float] = None
+        self.consecutive_failures = 0
+        self.last_failure = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool, latency: float):
+        with self._lock:
+            self.success_rate = (1 - self.alpha) * self.success_rate + self.alpha * (1.0 if ok else 0.0)
+            self.latency = latency if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * latency
+            if ok:
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                self.last_failure = time.monotonic()
+
+    @property
+    def available(self) -> bool:
+        with self._lock:
+            return (
+                self.consecutive_failures < self.failure_threshold
+                or time.monotonic() - self.last_failure >= self.cooldown
+            )
+
+    @property
+    def failing(self) -> bool:
+        """
+        Its last call failed, or most recent calls have, within the cooldown.
+        Once the cooldown has passed it is tried again in its usual place,
+        so a recovered provider gets the chance to record a success.
+        """
+        with self._lock:
+            return (
+                (self.consecutive_failures > 0 or self.success_rate < 0.5)
+                and time.monotonic() - self.last_failure < self.cooldown
+            )
+
+
+
+# Health and worker threads are shared by every pool in the process, so
+# what one session learns about a provider benefits all of them
+_health: Dict[str, ProviderHealth] = {}
+_health_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SEARCH_MAX_WORKERS", "16")), thread_name_prefix="search")
+
+
+def provider_health(name: str) -> ProviderHealth:
+    with _health_lock:
+        if name not in _health:
+            _health[name] = ProviderHealth()
+        return _health[name]
+
+
+def is_good_result_set(results: Optional[List[Dict]]) -> bool:
+    """A usable result set has at least one result with a URL and content."""
+    return bool(results) and any(
+        isinstance(result, dict) and result.get('url', '#') != '#' and result.get('content')
+        for result in results
+    )
+
+
+class ProviderPool:
+    """
+    Query a set of search providers either one after another in configured
+    order, trying failing ones last, or by racing them concurrently and
+    taking the first good result set within a deadline.
+    """
+
+    def __init__(self, providers: List[SearchProvider], mode: str = "fallback", race_deadline: float = 5.0, race_width: Optional[int] = None, slow_factor: float = 2.0):
+        if not providers:
+            raise ValueError("At least one search provider is required")
+        if mode not in ("fallback", "race"):
+            raise ValueError(f"Unknown search mode: {mode}")
+        self.providers = providers
+        self.mode = mode
+        self.race_deadline = race_deadline
+        self.race_width = race_width
+        self.slow_factor = slow_factor
+        self.health = {provider.name: provider_health(provider.name) for provider in providers}
+
+    def ranked(self) -> List[SearchProvider]:
+        """
+        Providers in configured order, with slow ones (observed latency over
+        ``slow_factor`` times the fastest healthy provider's) moved after
+        the rest, failing ones after those and cooling-down ones last.
+        Health only demotes: a provider that hasn't been tried never jumps
+        ahead of one that is working.
+        """
+        order = {provider.name: index for index, provider in enumerate(self.providers)}
+        health = {provider.name: self.health[provider.name] for provider in self.providers}
+        failing = {name: state.failing for name, state in health.items()}
+        latencies = [state.latency for name, state in health.items() if state.latency is not None and not failing[name]]
+        fastest = min(latencies) if latencies else None
+
+        def slow(name: str) -> bool:
+            latency = health[name].latency
+            return fastest is not None and latency is not None and latency > self.slow_factor * fastest
+
+        return sorted(
+            self.providers,
+            key=lambda provider: (
+                not health[provider.name].available,
+                failing[provider.name],
+                slow(provider.name),
+                order[provider.name]
+            )
+        )
+
+    def _call(self, provider: SearchProvider, query: str, max_results: int, topic: str, days: Optional[int]) -> List[Dict]:
+        started = time.monotonic()
+        try:
+            results = provider.search(query, max_results=max_results, topic=topic, days=days)
+        except Exception:
+            self.health[provider.name].record(False, time.monotonic() - started)
+            metrics.increment(f"search.provider.{provider.name}.error")
+            raise
+        elapsed = time.monotonic() - started
+        ok = is_good_result_set(results)
+        self.health[provider.name].record(ok, elapsed)
+        metrics.observe(f"search.provider.{provider.name}.latency_seconds", elapsed)
+        metrics.increment(f"search.provider.{provider.name}.{'ok' if ok else 'empty'}")
+        return results
+
+    def search(self, query: str, max_results: int = 3, topic: str = "general", days: Optional[int] = None) -> List[Dict]:
+        """Return the first good result set; raises SearchProviderError if none."""
+        if self.mode == "race" and len(self.providers) > 1:
+            return self._race(query, max_results, topic, days)
+        return self._fallback(query, max_results, topic, days)
+
+    def _fallback(self, query: str, max_results: int, topic: str, days: Optional[int]) -> List[Dict]:
+        errors = []
+        for provider in self.ranked():
+            try:
+                results = self._call(provider, query, max_results, topic, days)
+            except Exception as e:
+                logger.warning(f"{provider.name} search failed: {str(e)}")
+                errors.append(f"{provider.name}: {str(e)}")
+                continue
+            if is_good_result_set(results):
+                metrics.increment(f"search.provider.{provider.name}.served")
+                return results
+            errors.append(f"{provider.name}: no results")
+        raise SearchProviderError("; ".join(errors))
+
+    def _race(self, query: str, max_results: int, topic: str, days: Optional[int]) -> List[Dict]:
+        contenders = self.ranked()
+        contenders = [provider for provider in contenders if self.health[provider.name].available] or contenders
+        if self.race_width:
+            contenders = contenders[:self.race_width]
+
+        futures = {
+            _executor.submit(self._call, provider, query, max_results, topic, days): provider
+            for provider in contenders
+        }
+        deadline = time.monotonic() + self.race_deadline
+        pending = set(futures)
+        errors = []
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = futures[future]
+                if future.exception() is not None:
+                    errors.append(f"{provider.name}: {str(future.exception())}")
+                    continue
+                results = future.result()
+                if is_good_result_set(results):
+                    # Slower providers finish in the background and still
+                    # update their health
+                    metrics.increment(f"search.provider.{provider.name}.served")
+                    return results
+                errors.append(f"{provider.name}: no results")
+
+        if pending:
+            metrics.increment("search.race.deadline_exceeded")
+            errors.append(f"deadline of {self.race_deadline:.1f}s exceeded")
+        raise SearchProviderError("; ".join(errors))
+
+
+def providers_from_env() -> List[SearchProvider]:
+    """Instantiate the providers listed in SEARCH_PROVIDERS, skipping unusable ones."""
+    factories = {
+        TavilyProvider.name: TavilyProvider,
+        DuckDuckGoProvider.name: DuckDuckGoProvider,
+    }
+    providers = []
+    for name in os.getenv("SEARCH_PROVIDERS", "tavily,duckduckgo").split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in factories:
+            logger.warning(f"Unknown search provider: {name}")
+            continue
+        try:
+            providers.append(factories[name]())
+        except Exception as e:
+            logger.warning(f"Search provider {name} unavailable: {str(e)}")
+    return providers
+
+
+def pool_from_env(providers: Optional[List[SearchProvider]] = None) -> ProviderPool:
+    """Build a ProviderPool configured from SEARCH_* variables."""
+    race_width = os.getenv("SEARCH_RACE_WIDTH", "").strip()
+    return ProviderPool(
+        providers if providers is not None else providers_from_env(),
+        mode=os.getenv("SEARCH_MODE", "fallback").strip().lower(),
+        race_deadline=float(os.getenv("SEARCH_RACE_DEADLINE", "5")),
+        race_width=int(race_width) if race_width else None,
+        slow_factor=float(os.getenv("SEARCH_SLOW_FACTOR", "2"))
+    )
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+import threading
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+from cancellation import CancellationToken, raise_if_cancelled
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Call:
+    """One in-flight upstream call and the outcome shared with its waiters."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one upstream request.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight wait for and share its result. Nothing is
+    cached: the key is released as soon as the call finishes, and errors are
+    raised in every waiter rather than remembered.
+    """
+
+    def __init__(self, name: str, timeout: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout if timeout is not None else float(os.getenv("SINGLEFLIGHT_TIMEOUT", "30"))
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running."""
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: Hashable, fn: Callable[[], T], timeout: Optional[float] = None, cancel_token: Optional[CancellationToken] = None) -> T:
+        """
+        Run ``fn`` for ``key`` or join the call already in flight.
+
+        Waiters give up with TimeoutError after ``timeout`` seconds and with
+        GenerationCancelled if their ``cancel_token`` fires; the shared call
+        itself keeps running for the others.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if leader:
+            metrics.increment(f"singleflight.{self.name}.leader")
+            try:
+                call.result = fn()
+                return call.result
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+                call.done.set()
+
+        metrics.increment(f"singleflight.{self.name}.shared")
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while not call.done.wait(min(0.1, max(0.0, deadline - time.monotonic()))):
+            raise_if_cancelled(cancel_token)
+            if time.monotonic() >= deadline:
+                metrics.increment(f"singleflight.{self.name}.timeout")
+                raise TimeoutError(f"Timed out after {timeout:.1f}s waiting for in-flight {self.name} call")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Asyncio counterpart of ``do``, coalescing tasks on the running loop."""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        with self._lock:
+            future = self._async_calls.get(loop_key)
+            leader = future is None
+            if leader:
+                future = loop.create_future()
+                self._async_calls[loop_key] = future
+
+        if leader:
+            metrics.increment(f"singleflight.{self.name}.leader")
+            try:
+                result = await fn()
+                future.set_result(result)
+                return result
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                # Mark retrieved so a call without waiters doesn't warn
+                future.exception()
+                raise
+            finally:
+                with self._lock:
+                    if self._async_calls.get(loop_key) is future:
+                        del self._async_calls[loop_key]
+
+        metrics.increment(f"singleflight.{self.name}.shared")
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            metrics.increment(f"singleflight.{self.name}.timeout")
+            raise TimeoutError(f"Timed out after {timeout:.1f}s waiting for in-flight {self.name} call")
@@ -1,13 +1,23 @@
 import streamlit as st
 import os
 from groq_client import GroqClient
+from cancellation import CancellationToken, GenerationCancelled
+from result_store import SessionResults
+from local_index import local_index
+from parallel_answer import ParallelAnswer
+from admission import AdmissionRejected, BUSY_MESSAGE
+from log_config import configure_logging
+from profiling import profiled
 import logging
 import re
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# How often a pending parallel answer is redrawn while it generates
+PARALLEL_POLL_INTERVAL = float(os.getenv("PARALLEL_POLL_INTERVAL", "0.25"))
+
 def extract_reasoning(text: str):
     """Extract the reasoning section from the response."""
     think_match = re.search(r'<think>(.*?)</think>', text, re.DOTALL)
@@ -15,6 +25,14 @@ def extract_reasoning(text: str):
         return think_match.group(1).strip(), re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
     return None, text
 
+def cancel_active_generation(reason: str):
+    """Cancel the generation still running for this session, if any."""
+    cancel_token = st.session_state.get("active_generation")
+    if cancel_token is not None:
+        cancel_token.cancel(reason)
+        st.session_state.active_generation = None
+    st.session_state.pending_answer = None
+
 def initialize_chat():
     if "messages" not in st.session_state:
         st.session_state.messages = []
@@ -22,8 +40,27 @@ def initialize_chat():
     if "search_enabled" not in st.session_state:
         st.session_state.search_enabled = False
 
-    if "search_results" not in st.session_state:
-        st.session_state.search_results = None
+    if "parallel_enabled" not in st.session_state:
+        st.session_state.parallel_enabled = os.getenv("PARALLEL_ANSWERS", "0").lower() in ("1", "true", "yes")
+
+    # Parallel answer still generating in the background, and the error of
+    # the last one that failed
+    if "pending_answer" not in st.session_state:
+        st.session_state.pending_answer = None
+
+    if "answer_error" not in st.session_state:
+        st.session_state.answer_error = None
+
+    # Search results live in the shared result store; the session keeps IDs
+    if "search_result_ids" not in st.session_state:
+        st.session_state.search_result_ids = None
+
+    if "result_refs" not in st.session_state:
+        st.session_state.result_refs = SessionResults()
+
+    # This conversation's view of the shared local retrieval index
+    if "index_session" not in st.session_state:
+        st.session_state.index_session = local_index.session()
 
     if "groq_client" not in st.session_state:
         try:
@@ -89,6 +126,61 @@ def display_search_results(search_results):
                     </div>
                     """, unsafe_allow_html=True)
 
+def display_reasoning(reasoning, answer, placeholder_text=None):
+    """Display a (possibly partial) reasoning section and answer."""
+    if reasoning.strip():
+        st.markdown("### 🧠 Reasoning Process\n" + format_thinking(reasoning), unsafe_allow_html=True)
+    if answer.strip():
+        st.markdown(answer.strip())
+    elif placeholder_text:
+        st.markdown(placeholder_text)
+
+def finish_pending_answer(pending):
+    """Move a finished parallel answer into the chat history."""
+    st.session_state.pending_answer = None
+    if st.session_state.get("active_generation") is pending.token:
+        st.session_state.active_generation = None
+
+    response, search_results = pending.result()
+    if response is None:
+        st.session_state.answer_error = f"Error generating response: {pending.error() or 'no response'}"
+        return
+
+    response_message = {"role": "assistant", "content": response}
+    st.session_state.search_result_ids = st.session_state.result_refs.add(search_results) if search_results else None
+    if st.session_state.search_result_ids:
+        response_message['search_result_ids'] = st.session_state.search_result_ids
+    st.session_state.messages.append(response_message)
+
+@st.fragment(run_every=PARALLEL_POLL_INTERVAL)
+def render_pending_answer():
+    """
+    Redraw the answer generating in the background. Only this fragment
+    reruns while it polls, so the rest of the page stays responsive.
+    """
+    pending = st.session_state.get("pending_answer")
+    if pending is None:
+        return
+
+    state = pending.poll()
+    plain, grounded = state["plain"], state["grounded"]
+    with st.chat_message("assistant"):
+        if grounded["search_results"]:
+            display_search_results(grounded["search_results"])
+
+        if grounded["answer"].strip():
+            # The grounded answer takes over as soon as it has started
+            display_reasoning(grounded["reasoning"], grounded["answer"])
+        else:
+            display_reasoning(plain["reasoning"], plain["answer"], "🤔 Thinking...")
+            if not grounded["done"]:
+                st.caption("🔍 Checking the web for a grounded answer...")
+
+    if state["finished"]:
+        finish_pending_answer(pending)
+        st.rerun()
+
+@profiled("streamlit_run")
 def main():
     st.title("🤖 AI Research Assistant")
 
@@ -102,13 +194,20 @@ def main():
         value=st.session_state.search_enabled
     )
 
+    if st.session_state.search_enabled:
+        st.session_state.parallel_enabled = st.toggle(
+            "Answer right away while searching",
+            help="Shows an answer without search immediately and replaces it with the search-grounded answer when that is ready.",
+            value=st.session_state.parallel_enabled
+        )
+
     # Display chat messages
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             if message["role"] == "assistant":
                 # Display search results if available
-                if 'search_results' in message:
-                    display_search_results(message['search_results'])
+                if 'search_result_ids' in message:
+                    display_search_results(st.session_state.result_refs.resolve(message['search_result_ids']))
 
                 reasoning, answer = extract_reasoning(message["content"])
                 if reasoning:
@@ -118,8 +217,15 @@ def main():
             else:
                 st.markdown(message["content"])
 
+    if st.session_state.answer_error:
+        st.error(st.session_state.answer_error)
+        st.session_state.answer_error = None
+
     # Chat input
     if prompt := st.chat_input("Ask anything..."):
+        # A new submission supersedes anything still generating for this session
+        cancel_active_generation("new_submission")
+
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
 
@@ -127,60 +233,113 @@ def main():
         with st.chat_message("user"):
             st.markdown(prompt)
 
+        if st.session_state.search_enabled and st.session_state.parallel_enabled:
+            # Both answers generate in background threads; this run ends
+            # right away and render_pending_answer polls them
+            pending = ParallelAnswer(
+                st.session_state.groq_client,
+                [{"role": m["role"], "content": m["content"]} for m in st.session_state.messages],
+                index_session=st.session_state.index_session
+            ).start()
+            st.session_state.pending_answer = pending
+            st.session_state.active_generation = pending.token
+            render_pending_answer()
+            return
+
+        cancel_token = CancellationToken()
+        st.session_state.active_generation = cancel_token
+        response = None
         try:
             # Display assistant response
             with st.chat_message("assistant"):
                 message_placeholder = st.empty()
                 message_placeholder.markdown("🤔 Thinking...")
+                search_container = st.container()
+                reasoning_placeholder = st.empty()
+                answer_placeholder = st.empty()
 
-                # Generate response with search if enabled
-                if st.session_state.search_enabled:
-                    # Get search results
-                    search_results = st.session_state.groq_client.search_manager.search(prompt)
-                    st.session_state.search_results = search_results
-
-                    # Display search results
-                    display_search_results(search_results)
-
-                    # Use search-enabled response generation
-                    response = st.session_state.groq_client.generate_response_with_search(
-                        st.session_state.messages
-                    )
-                else:
-                    st.session_state.search_results = None
-                    # Use standard response generation
-                    response = st.session_state.groq_client.generate_response(
-                        st.session_state.messages
-                    )
-
-                # Extract and display reasoning and answer separately
-                reasoning, answer = extract_reasoning(response)
+                # Stream the response, with search first if enabled. Every
+                # placeholder update is a point where Streamlit can stop this
+                # run for a rerun or a closed tab; the finally block below
+                # then cancels the upstream request.
+                search_results = None
+                reasoning = ""
+                answer = ""
+                for event, data in st.session_state.groq_client.stream_response(
+                    # Only role/content go upstream, not the result IDs
+                    [{"role": m["role"], "content": m["content"]} for m in st.session_state.messages],
+                    search=st.session_state.search_enabled,
+                    cancel_token=cancel_token,
+                    index_session=st.session_state.index_session
+                ):
+                    if event == "route":
+                        if data["search"]:
+                            message_placeholder.markdown(f"🔍 Searching the web ({data['topic']})...")
+                    elif event == "search_results":
+                        # Shown while the model is still working on the answer
+                        message_placeholder.markdown("🤔 Thinking...")
+                        search_results = data
+                        with search_container:
+                            display_search_results(search_results)
+                    elif event == "reasoning":
+                        message_placeholder.empty()
+                        reasoning += data
+                        reasoning_placeholder.markdown(
+                            "### 🧠 Reasoning Process\n" + format_thinking(reasoning),
+                            unsafe_allow_html=True
+                        )
+                    elif event == "answer":
+                        message_placeholder.empty()
+                        answer += data
+                        if answer.strip():
+                            answer_placeholder.markdown(answer.strip() + "▌")
+                    elif event == "timings":
+                        logger.info("Response stage timings", extra={
+                            "event": "pipeline.timings",
+                            **{f"{stage}_seconds": round(seconds, 3) for stage, seconds in data.items()}
+                        })
+                    elif event == "done":
+                        response = data
 
                 # Clear the thinking placeholder
                 message_placeholder.empty()
 
-                if reasoning:
-                    # Show reasoning process
-                    st.markdown("### 🧠 Reasoning Process")
-                    st.markdown(format_thinking(reasoning), unsafe_allow_html=True)
-
                 # Show final response
                 if answer.strip():
-                    st.markdown(answer.strip())
+                    answer_placeholder.markdown(answer.strip())
+
+                st.session_state.search_result_ids = (
+                    st.session_state.result_refs.add(search_results) if search_results else None
+                )
 
-                # Add assistant response to chat history with search results
+                # Add assistant response to chat history with search result IDs
                 response_message = {
                     "role": "assistant",
                     "content": response,
                 }
-                if st.session_state.search_results:
-                    response_message['search_results'] = st.session_state.search_results
+                if st.session_state.search_result_ids:
+                    response_message['search_result_ids'] = st.session_state.search_result_ids
                 st.session_state.messages.append(response_message)
 
+        except GenerationCancelled as e:
+            logger.info(str(e))
+        except AdmissionRejected as e:
+            logger.warning(str(e))
+            st.warning(BUSY_MESSAGE)
         except Exception as e:
             error_msg = f"Error generating response: {str(e)}"
             logger.error(error_msg)
             st.error(error_msg)
+        finally:
+            # Reached without a response when Streamlit interrupted the run
+            if response is None:
+                cancel_token.cancel("interrupted")
+            if st.session_state.get("active_generation") is cancel_token:
+                st.session_state.active_generation = None
+        return
+
+    if st.session_state.pending_answer is not None:
+        render_pending_answer()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
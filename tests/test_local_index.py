@@ -0,0 +1,50 @@
+from local_index import LocalIndex
+
+WORLD_CUP_2018 = {
+    "title": "2018 FIFA World Cup final",
+    "url": "https://example.com/2018-world-cup-final",
+    "content": "France won the 2018 World Cup, beating Croatia 4-2 in the final in Moscow.",
+}
+
+
+def make_index(scope: str = "session"):
+    index = LocalIndex(scope=scope)
+    session = index.session()
+    index.add([WORLD_CUP_2018], session=session)
+    return index, session
+
+
+def test_lookup_answers_covered_question():
+    index, session = make_index()
+    results = index.lookup("Who won the 2018 World Cup?", session=session)
+    assert results and results[0]["url"] == WORLD_CUP_2018["url"]
+
+
+def test_lookup_misses_when_year_differs():
+    index, session = make_index()
+    assert index.lookup("Who won the 2022 World Cup?", session=session) is None
+    assert index.lookup("Who won the World Cup in 2026?", session=session) is None
+
+
+def test_lookup_misses_when_distinctive_term_is_uncovered():
+    index, session = make_index()
+    assert index.lookup("Who won the World Cup in Qatar?", session=session) is None
+
+
+def test_session_scope_hides_other_sessions_passages():
+    index, _ = make_index()
+    assert index.lookup("Who won the 2018 World Cup?", session=index.session()) is None
+    assert index.lookup("Who won the 2018 World Cup?") is None
+
+
+def test_global_scope_shares_passages():
+    index, _ = make_index(scope="global")
+    assert index.lookup("Who won the 2018 World Cup?", session=index.session())
+    assert index.lookup("Who won the 2018 World Cup?")
+
+
+def test_reference_resolves_against_own_session_only():
+    index, session = make_index(scope="global")
+    session.recent_results = [WORLD_CUP_2018]
+    assert index.lookup("summarize source 1", session=session) == [WORLD_CUP_2018]
+    assert index.lookup("summarize source 1", session=index.session()) is None
@@ -1,5 +1,6 @@
 from typing import List, Dict
 import time
+import threading
 from datetime import datetime
 from difflib import SequenceMatcher
 from dataclasses import dataclass
@@ -110,4 +111,94 @@ def handle_rate_limit(func):
                     time.sleep(RETRY_DELAY * (attempt + 1))
                     continue
                 raise e
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+class ThinkTagParser:
+    """
+    Incrementally split streamed model output into reasoning and answer deltas.
+
+    Mirrors ``GroqClient.extract_thinking_tags``: the first <think>...</think>
+    block is reasoning, everything else is answer. Tags split across chunk
+    boundaries are held back until they can be recognised.
+    """
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self):
+        self.in_think = False
+        self.seen_think = False
+        self._buffer = ""
+
+    @property
+    def kind(self) -> str:
+        return "reasoning" if self.in_think else "answer"
+
+    def feed(self, text: str) -> List[tuple]:
+        """Consume a chunk and return the ``(kind, text)`` deltas it completes."""
+        self._buffer += text
+        events = []
+
+        while self._buffer:
+            if self.in_think:
+                tag = self.CLOSE_TAG
+            elif not self.seen_think:
+                tag = self.OPEN_TAG
+            else:
+                events.append((self.kind, self._buffer))
+                self._buffer = ""
+                break
+
+            index = self._buffer.find(tag)
+            if index >= 0:
+                if index:
+                    events.append((self.kind, self._buffer[:index]))
+                self._buffer = self._buffer[index + len(tag):]
+                if self.in_think:
+                    self.seen_think = True
+                self.in_think = not self.in_think
+                continue
+
+            # Hold back a trailing fragment that could be the start of the tag
+            keep = 0
+            for size in range(min(len(tag) - 1, len(self._buffer)), 0, -1):
+                if tag.startswith(self._buffer[-size:]):
+                    keep = size
+                    break
+            emit = self._buffer[:len(self._buffer) - keep]
+            if emit:
+                events.append((self.kind, emit))
+            self._buffer = self._buffer[len(self._buffer) - keep:]
+            break
+
+        return events
+
+    def flush(self) -> List[tuple]:
+        """Return whatever is still buffered once the stream has ended."""
+        events = [(self.kind, self._buffer)] if self._buffer else []
+        self._buffer = ""
+        return events
+
+
+def normalize_query(query: str) -> str:
+    """Normalise a query for use as a coalescing or cache key."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+class TokenBucket:
+    """Simple rate limiter: ``rate`` tokens per second up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False